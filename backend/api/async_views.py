@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import path
+
+from api.views import IngredientViewSet, RecipeViewSet, TagViewSet
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+LIST_ACTIONS = {'get': 'list', 'post': 'create'}
+DETAIL_ACTIONS = {
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+}
+
+# В Django 3.2 нет асинхронного ORM, а sync-код под ASGI по умолчанию
+# выполняется в одном общем потоке. Чтения уходят в отдельный пул: его
+# размер и есть предел одновременных запросов к БД на воркер.
+read_executor = ThreadPoolExecutor(
+    settings.ASYNC_READ_CONCURRENCY, thread_name_prefix='async-read'
+)
+
+
+def render_read(view, request, *args, **kwargs):
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_read_view(viewset, actions, **initkwargs):
+    view = viewset.as_view(actions, **initkwargs)
+    read = sync_to_async(
+        render_read, thread_sensitive=False, executor=read_executor
+    )
+    write = sync_to_async(view)
+
+    async def async_view(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return await read(view, request, *args, **kwargs)
+        return await write(request, *args, **kwargs)
+
+    async_view.csrf_exempt = True
+    return async_view
+
+
+def async_read_urls():
+    urls = []
+    for basename, viewset in (
+        ('recipes', RecipeViewSet),
+        ('tags', TagViewSet),
+        ('ingredients', IngredientViewSet),
+    ):
+        for route, actions, detail in (
+            (f'{basename}/', LIST_ACTIONS, False),
+            (f'{basename}/<int:pk>/', DETAIL_ACTIONS, True),
+        ):
+            actions = {
+                method: action for method, action in actions.items()
+                if hasattr(viewset, action)
+            }
+            urls.append(path(
+                route,
+                async_read_view(
+                    viewset, actions, basename=basename, detail=detail
+                ),
+                name=f'{basename}-{"detail" if detail else "list"}',
+            ))
+    return urls
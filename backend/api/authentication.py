@@ -0,0 +1,131 @@
+from collections import OrderedDict
+from hashlib import sha256
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+
+from users.models import User
+
+
+def token_cache_key(key):
+    return f'auth_token:{sha256(key.encode()).hexdigest()}'
+
+
+def user_snapshot(user):
+    # В кеш попадает только нужное для аутентификации: вместо хеша
+    # пароля хранится производная от него метка, как в сессиях Django.
+    return user.pk, user.is_active, user.get_session_auth_hash()
+
+
+def snapshot_user(pk, is_active):
+    # Остальные поля отложены и при обращении читаются из базы.
+    return User.from_db(
+        router.db_for_read(User), ('id', 'is_active'), (pk, is_active)
+    )
+
+
+class TokenUserCache:
+
+    def __init__(self):
+        self.lock = Lock()
+        self.users = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.users.get(key)
+            if entry is None:
+                return None
+            user, expires = entry
+            if monotonic() > expires:
+                del self.users[key]
+                return None
+            self.users.move_to_end(key)
+            return user
+
+    def set(self, key, user):
+        if settings.TOKEN_CACHE_LOCAL_TTL <= 0:
+            return
+        with self.lock:
+            self.users[key] = (
+                user, monotonic() + settings.TOKEN_CACHE_LOCAL_TTL
+            )
+            self.users.move_to_end(key)
+            while len(self.users) > settings.TOKEN_CACHE_SIZE:
+                self.users.popitem(last=False)
+
+    def delete(self, keys):
+        with self.lock:
+            for key in keys:
+                self.users.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.users.clear()
+
+
+token_users = TokenUserCache()
+
+
+def drop_tokens(keys):
+    token_users.delete(keys)
+    cache.delete_many([token_cache_key(key) for key in keys])
+
+
+def invalidate_tokens(keys):
+    # Как и версии страниц, кеш очищается после коммита: иначе
+    # параллельный запрос успеет закешировать снимок по ещё не удалённому
+    # токену. Локальный уровень других воркеров устаревает не дольше
+    # TOKEN_CACHE_LOCAL_TTL.
+    keys = list(keys)
+    transaction.on_commit(lambda: drop_tokens(keys))
+
+
+def invalidate_user_tokens(user_id):
+    invalidate_tokens(
+        Token.objects.filter(user_id=user_id).values_list('key', flat=True)
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    # Снимок сбрасывается сигналами при сохранении пользователя. Смена
+    # is_active через queryset.update() сигналов не шлёт: такой токен
+    # ещё до TOKEN_CACHE_TIMEOUT принимается в читающих запросах.
+
+    def authenticate(self, request):
+        self.fresh_user = request.method not in SAFE_METHODS
+        return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        snapshot = token_users.get(key)
+        if snapshot is None:
+            snapshot = cache.get(token_cache_key(key))
+            if snapshot is not None:
+                token_users.set(key, snapshot)
+        if self.fresh_user or snapshot is None:
+            # Изменяющие запросы получают строку прямо из базы: djoser
+            # сохраняет request.user целиком.
+            try:
+                user, token = super().authenticate_credentials(key)
+            except AuthenticationFailed:
+                invalidate_tokens([key])
+                raise
+            if snapshot != user_snapshot(user):
+                snapshot = user_snapshot(user)
+                cache.set(
+                    token_cache_key(key), snapshot,
+                    settings.TOKEN_CACHE_TIMEOUT,
+                )
+                token_users.set(key, snapshot)
+            return user, token
+        pk, is_active, _ = snapshot
+        if not is_active:
+            raise AuthenticationFailed('Пользователь неактивен или удалён.')
+        user = snapshot_user(pk, is_active)
+        return user, Token(key=key, user=user)
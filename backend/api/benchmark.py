@@ -0,0 +1,321 @@
+import base64
+import json
+import random
+from io import BytesIO
+from pathlib import Path
+from secrets import token_hex
+from statistics import mean
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api.cache import bump_reference_version
+from api.documents import rebuild_recipe_documents
+from api.instrumentation import QueryTimer
+from api.renderers import FastJSONRenderer
+from recipes.counters import recount
+from recipes.fulltext import update_search_vectors
+from recipes.matching import recipe_matcher
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, ShoppingCart, Tag)
+from recipes.search import ingredient_index
+from recipes.shopping_list import rebuild_shopping_lists
+from users.models import Subscription, User
+
+INGREDIENTS_FILE = (
+    Path(__file__).resolve().parent.parent / 'recipes/data/ingredients.json'
+)
+BATCH_SIZE = 1000
+TAGS = 6
+
+
+def sample(rng, population, size):
+    return rng.sample(population, min(size, len(population)))
+
+
+def png_base64():
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), 'orange').save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+class BenchmarkData:
+
+    def __init__(self, users=100, recipes=1000, ingredients_per_recipe=8,
+                 favorites=20, cart=10, subscriptions=10, seed=0):
+        self.users = users
+        self.recipes = recipes
+        self.ingredients_per_recipe = ingredients_per_recipe
+        self.favorites = favorites
+        self.cart = cart
+        self.subscriptions = subscriptions
+        self.rng = random.Random(seed)
+        self.prefix = f'bench-{token_hex(4)}'
+
+    def generate(self):
+        with open(INGREDIENTS_FILE, encoding='utf-8') as file:
+            Ingredient.objects.bulk_create(
+                (Ingredient(**record) for record in json.load(file)),
+                batch_size=BATCH_SIZE, ignore_conflicts=True,
+            )
+        self.ingredients = list(Ingredient.objects.values_list('id', 'name'))
+        slugs = [f'bench{i}' for i in range(TAGS)]
+        Tag.objects.bulk_create(
+            (
+                Tag(name=f'Бенчмарк {slug}', slug=slug)
+                for slug in slugs
+            ),
+            ignore_conflicts=True,
+        )
+        self.tags = list(Tag.objects.filter(
+            slug__in=slugs
+        ).values_list('id', flat=True))
+
+        password = make_password('benchmark')
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f'{self.prefix}-{i}',
+                    email=f'{self.prefix}-{i}@example.com',
+                    first_name='Бенчмарк', last_name=str(i),
+                    password=password,
+                )
+                for i in range(self.users)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        self.user_ids = list(User.objects.filter(
+            username__startswith=f'{self.prefix}-'
+        ).values_list('id', flat=True))
+
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author_id=self.rng.choice(self.user_ids),
+                    name=f'Рецепт {i}',
+                    text='Описание рецепта ' * 20,
+                    image='media/recipes/benchmark.png',
+                    cooking_time=self.rng.randint(5, 120),
+                )
+                for i in range(self.recipes)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        self.recipe_ids = list(Recipe.objects.filter(
+            author_id__in=self.user_ids
+        ).values_list('id', flat=True))
+        ingredient_ids = [pk for pk, _ in self.ingredients]
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe_id=recipe_id, ingredient_id=ingredient_id,
+                    amount=self.rng.randint(1, 500),
+                )
+                for recipe_id in self.recipe_ids
+                for ingredient_id in sample(
+                    self.rng, ingredient_ids, self.ingredients_per_recipe
+                )
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        RecipeTag.objects.bulk_create(
+            (
+                RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in self.recipe_ids
+                for tag_id in sample(self.rng, self.tags, 2)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        for model in (Favorite, ShoppingCart):
+            size = self.favorites if model is Favorite else self.cart
+            model.objects.bulk_create(
+                (
+                    model(user_id=user_id, recipe_id=recipe_id)
+                    for user_id in self.user_ids
+                    for recipe_id in sample(self.rng, self.recipe_ids, size)
+                ),
+                batch_size=BATCH_SIZE,
+            )
+        Subscription.objects.bulk_create(
+            (
+                Subscription(user_id=user_id, author_id=author_id)
+                for user_id in self.user_ids
+                for author_id in sample(
+                    self.rng, self.user_ids, self.subscriptions + 1
+                )[:self.subscriptions]
+                if author_id != user_id
+            ),
+            batch_size=BATCH_SIZE,
+        )
+
+        recount(Recipe, User, Favorite, Subscription)
+        rebuild_shopping_lists()
+        rebuild_recipe_documents(self.recipe_ids)
+        update_search_vectors(self.recipe_ids)
+        self.reset_indexes()
+        self.reader = User.objects.get(pk=self.user_ids[0])
+        self.token = Token.objects.create(user=self.reader)
+        self.image = png_base64()
+
+    @staticmethod
+    def reset_indexes():
+        bump_reference_version(Ingredient)
+        bump_reference_version(Tag)
+        ingredient_index.invalidate()
+        recipe_matcher.invalidate()
+
+    def client(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        return client
+
+
+def recipe_list(data, client):
+    page = data.rng.randint(1, max(data.recipes // 6, 1))
+    return client.get(f'/api/recipes/?page={page}&limit=6')
+
+
+def recipe_detail(data, client):
+    return client.get(f'/api/recipes/{data.rng.choice(data.recipe_ids)}/')
+
+
+def recipe_create(data, client):
+    return client.post('/api/recipes/', {
+        'name': 'Новый рецепт',
+        'text': 'Описание',
+        'cooking_time': 15,
+        'image': data.image,
+        'tags': sample(data.rng, data.tags, 2),
+        'ingredients': [
+            {'id': pk, 'amount': data.rng.randint(1, 500)}
+            for pk, _ in sample(
+                data.rng, data.ingredients, data.ingredients_per_recipe
+            )
+        ],
+    }, format='json')
+
+
+def shopping_list(data, client):
+    return client.get('/api/recipes/download_shopping_cart/?format=txt')
+
+
+def subscriptions(data, client):
+    return client.get('/api/users/subscriptions/?limit=6&recipes_limit=3')
+
+
+def ingredient_search(data, client):
+    _, name = data.rng.choice(data.ingredients)
+    return client.get('/api/ingredients/', {'name': name[:3]})
+
+
+def ingredient_list(data, client):
+    return client.get('/api/ingredients/')
+
+
+def recipe_page(data, client):
+    return client.get('/api/recipes/?limit=100')
+
+
+BENCHMARKS = {
+    'recipe-list': recipe_list,
+    'recipe-detail': recipe_detail,
+    'recipe-create': recipe_create,
+    'shopping-list': shopping_list,
+    'subscriptions': subscriptions,
+    'ingredient-search': ingredient_search,
+    'ingredient-list': ingredient_list,
+    'recipe-page': recipe_page,
+}
+RENDERERS = {
+    'json': JSONRenderer,
+    'fast': FastJSONRenderer,
+}
+RENDER_BENCHMARKS = ('ingredient-list', 'recipe-page')
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def format_table(rows):
+    # Первая колонка — подпись, остальные — числа и выравниваются вправо.
+    widths = [max(map(len, column)) for column in zip(*rows)]
+    return [
+        '  '.join(
+            value.ljust(width) if not index else value.rjust(width)
+            for index, (value, width) in enumerate(zip(row, widths))
+        ).rstrip()
+        for row in rows
+    ]
+
+
+def run_benchmark(data, name, iterations):
+    benchmark = BENCHMARKS[name]
+    client = data.client()
+    latencies = []
+    queries = []
+    for _ in range(iterations):
+        timer = QueryTimer()
+        start = perf_counter()
+        with connection.execute_wrapper(timer):
+            response = benchmark(data, client)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        latencies.append((perf_counter() - start) * 1000)
+        queries.append(timer.queries)
+        if response.status_code >= 400:
+            raise RuntimeError(
+                f'{name}: {response.status_code} {response.content[:200]}'
+            )
+    return {
+        'name': name,
+        'iterations': iterations,
+        'p50': percentile(latencies, 0.5),
+        'p95': percentile(latencies, 0.95),
+        'mean': mean(latencies),
+        'queries': mean(queries),
+        'max_queries': max(queries),
+    }
+
+
+def run_benchmarks(data, names, iterations):
+    return [run_benchmark(data, name, iterations) for name in names]
+
+
+def run_render_benchmark(data, name, iterations):
+    payload = BENCHMARKS[name](data, data.client()).data
+    expected = JSONRenderer().render(payload)
+    results = []
+    for renderer_name, renderer_class in RENDERERS.items():
+        renderer = renderer_class()
+        latencies = []
+        for _ in range(iterations):
+            start = perf_counter()
+            content = renderer.render(payload)
+            latencies.append((perf_counter() - start) * 1000)
+        results.append({
+            'name': name,
+            'renderer': renderer_name,
+            'iterations': iterations,
+            'p50': percentile(latencies, 0.5),
+            'p95': percentile(latencies, 0.95),
+            'mean': mean(latencies),
+            'size': len(content),
+            'same': content == expected,
+        })
+    return results
+
+
+def run_render_benchmarks(data, iterations):
+    return [
+        result
+        for name in RENDER_BENCHMARKS
+        for result in run_render_benchmark(data, name, iterations)
+    ]
@@ -0,0 +1,97 @@
+import json
+from hashlib import md5
+from time import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from recipes.models import Tag
+
+
+def reference_version_key(model):
+    return f'reference:{model._meta.label_lower}:version'
+
+
+def get_reference_version(model):
+    key = reference_version_key(model)
+    version = uuid4().hex
+    if not cache.add(key, version, settings.REFERENCE_CACHE_TIMEOUT):
+        version = cache.get(key, version)
+    return version
+
+
+def bump_reference_version(model):
+    cache.set(
+        reference_version_key(model), uuid4().hex,
+        settings.REFERENCE_CACHE_TIMEOUT,
+    )
+
+
+def payload_state(data):
+    # Версия случайна, истекает и у каждого locmem-воркера своя, поэтому
+    # валидаторы считаются по самим данным: одинаковый ответ получает
+    # одинаковый ETag, а Last-Modified — время, когда он впервые собран.
+    digest = md5(json.dumps(
+        data, cls=JSONEncoder, ensure_ascii=False
+    ).encode()).hexdigest()
+    key = f'reference:modified:{digest}'
+    last_modified = int(time())
+    if not cache.add(key, last_modified, None):
+        last_modified = cache.get(key, last_modified)
+    return digest, last_modified
+
+
+def get_tag_slugs():
+    version = get_reference_version(Tag)
+    key = f'reference:{Tag._meta.label_lower}:{version}:slugs'
+    slugs = cache.get(key)
+    if slugs is None:
+        slugs = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, slugs, settings.REFERENCE_CACHE_TIMEOUT)
+    return slugs
+
+
+class ReferenceCacheMixin:
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, view, request, *args, **kwargs):
+        model = self.queryset.model
+        version = get_reference_version(model)
+        path = request.get_full_path()
+        key = f'reference:{model._meta.label_lower}:{version}:{path}'
+        cached = cache.get(key)
+        if cached is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cached = (response.data, *payload_state(response.data))
+            cache.set(key, cached, settings.REFERENCE_CACHE_TIMEOUT)
+        data, digest, last_modified = cached
+        # JSON и browsable API под одним адресом — разные представления.
+        etag = quote_etag(md5(
+            f'{digest}:{request.accepted_media_type}'.encode()
+        ).hexdigest())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ('Accept', ))
+        return response
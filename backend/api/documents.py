@@ -0,0 +1,120 @@
+import json
+from collections import OrderedDict
+from threading import local
+
+from django.db import connection, transaction
+from rest_framework import serializers
+from rest_framework.utils.encoders import JSONEncoder
+
+from api.serializers import RecipeSerializer
+from api.user_state import get_user_state
+from recipes.models import Recipe, RecipeDocument
+
+# Вложенные части ответа не зависят от пользователя и меняются редко,
+# поэтому хранятся готовыми; поля самого рецепта берутся из его строки.
+DOCUMENT_FIELDS = ('tags', 'author', 'ingredients')
+BATCH_SIZE = 500
+
+
+def build_document(recipe):
+    data = RecipeSerializer(recipe).data
+    return json.dumps(
+        {name: data[name] for name in DOCUMENT_FIELDS},
+        cls=JSONEncoder, ensure_ascii=False,
+    )
+
+
+def rebuild_recipe_documents(recipe_ids):
+    recipe_ids = sorted(set(recipe_ids))
+    with transaction.atomic():
+        # Строки рецептов блокируются до чтения: пересборки одного рецепта
+        # идут по очереди, и более старая не перезапишет свежий документ.
+        recipes = Recipe.objects.filter(pk__in=recipe_ids)
+        if connection.features.has_select_for_update:
+            list(recipes.select_for_update().order_by('pk').values_list(
+                'pk', flat=True
+            ))
+        documents = [
+            RecipeDocument(recipe=recipe, data=build_document(recipe))
+            for recipe in recipes.select_related('author').with_related()
+        ]
+        RecipeDocument.objects.filter(recipe_id__in=recipe_ids).delete()
+        # Без select_for_update (SQLite) пересборки не ждут друг друга,
+        # и вставка уже собранного документа не должна стать ошибкой.
+        RecipeDocument.objects.bulk_create(documents, ignore_conflicts=True)
+    return documents
+
+
+def rebuild_all_recipe_documents():
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        rebuild_recipe_documents(recipe_ids[start:start + BATCH_SIZE])
+
+
+class PendingDocuments(local):
+
+    def __init__(self):
+        self.sources = []
+
+
+pending = PendingDocuments()
+
+
+def rebuild_pending_documents():
+    sources, pending.sources = pending.sources, []
+    recipe_ids = {recipe_id for source in sources for recipe_id in source}
+    if recipe_ids:
+        rebuild_recipe_documents(recipe_ids)
+
+
+def schedule_document_update(recipe_ids):
+    # Каскадное удаление присылает сигнал на каждую строку, поэтому
+    # id копятся до коммита и пересобираются одним проходом. recipe_ids
+    # может быть ленивым queryset: он выполнится после коммита.
+    pending.sources.append(recipe_ids)
+    transaction.on_commit(rebuild_pending_documents)
+
+
+def ensure_documents(recipes):
+    missing = {
+        recipe.id: recipe for recipe in recipes
+        if not hasattr(recipe, 'document')
+    }
+    if missing:
+        for document in rebuild_recipe_documents(missing):
+            missing[document.recipe_id].document = document
+
+
+class RecipeDocumentListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        recipes = list(data)
+        ensure_documents(recipes)
+        return super().to_representation(recipes)
+
+
+class RecipeDocumentSerializer(RecipeSerializer):
+
+    class Meta(RecipeSerializer.Meta):
+        list_serializer_class = RecipeDocumentListSerializer
+
+    def to_representation(self, instance):
+        ensure_documents((instance, ))
+        document = json.loads(instance.document.data)
+        request = self.context.get('request')
+        if request is not None:
+            state = get_user_state(request)
+            document['author']['is_subscribed'] = state.is_subscribed(
+                document['author']['id']
+            )
+        data = OrderedDict()
+        for field in self._readable_fields:
+            if field.field_name in document:
+                data[field.field_name] = document[field.field_name]
+                continue
+            attribute = field.get_attribute(instance)
+            data[field.field_name] = (
+                None if attribute is None
+                else field.to_representation(attribute)
+            )
+        return data
@@ -1,21 +1,23 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filter
-from rest_framework.filters import SearchFilter
 
-from recipes.models import Recipe, Tag
+from api.cache import get_tag_slugs
+from recipes.fulltext import search_recipes
+from recipes.models import Favorite, Recipe, RecipeTag, ShoppingCart
 
 
-class IngredientFilter(SearchFilter):
-    search_param = 'name'
+def tag_choices():
+    return [(slug, slug) for slug in get_tag_slugs()]
 
 
 class RecipeFilter(filter.FilterSet):
     author = filter.CharFilter()
-    tags = filter.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        queryset=Tag.objects.all(),
+    tags = filter.MultipleChoiceFilter(
+        choices=tag_choices,
         label='Tags',
-        to_field_name='slug'
+        method='get_tags',
     )
+    search = filter.CharFilter(method='get_search')
     is_favorited = filter.BooleanFilter(method='get_favorite')
     is_in_shopping_cart = filter.BooleanFilter(
         method='get_is_in_shopping_cart'
@@ -23,14 +25,31 @@ class RecipeFilter(filter.FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'search')
+
+    def get_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        slugs = get_tag_slugs()
+        return queryset.filter(Exists(RecipeTag.objects.filter(
+            recipe=OuterRef('pk'),
+            tag_id__in=[slugs.get(slug) for slug in value],
+        )))
+
+    def get_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
 
     def get_favorite(self, queryset, name, value):
         if value:
-            return queryset.filter(favorites__user=self.request.user.id)
+            return queryset.filter(Exists(Favorite.objects.filter(
+                user=self.request.user.id, recipe=OuterRef('pk')
+            )))
         return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         if value:
-            return queryset.filter(shopping_cart__user=self.request.user.id)
+            return queryset.filter(Exists(ShoppingCart.objects.filter(
+                user=self.request.user.id, recipe=OuterRef('pk')
+            )))
         return queryset
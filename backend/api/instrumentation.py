@@ -0,0 +1,192 @@
+import json
+import os
+from collections import Counter, defaultdict
+from pathlib import Path
+from threading import Lock
+from time import monotonic, perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+def bucket(value, bounds):
+    for index, bound in enumerate(bounds):
+        if value <= bound:
+            return index
+    return len(bounds)
+
+
+def percentile(histogram, bounds, fraction):
+    total = sum(histogram)
+    if not total:
+        return 0
+    seen = 0
+    for index, count in enumerate(histogram):
+        seen += count
+        if seen >= total * fraction:
+            return bounds[index] if index < len(bounds) else float('inf')
+    return float('inf')
+
+
+def empty_stats():
+    return {
+        'requests': 0,
+        'latency': 0.0,
+        'db': 0.0,
+        'serialize': 0.0,
+        'queries': 0,
+        'max_queries': 0,
+        'max_duplicates': 0,
+        'latency_histogram': [0] * (len(LATENCY_BUCKETS) + 1),
+        'query_histogram': [0] * (len(QUERY_BUCKETS) + 1),
+    }
+
+
+def merge_stats(target, source):
+    for key in ('requests', 'latency', 'db', 'serialize', 'queries'):
+        target[key] += source[key]
+    for key in ('max_queries', 'max_duplicates'):
+        target[key] = max(target[key], source[key])
+    for key in ('latency_histogram', 'query_histogram'):
+        target[key] = [a + b for a, b in zip(target[key], source[key])]
+    return target
+
+
+class Recorder:
+
+    def __init__(self):
+        self.stats = defaultdict(empty_stats)
+        self.lock = Lock()
+        self.flushed_at = monotonic()
+
+    def record(self, view, metrics):
+        with self.lock:
+            stats = self.stats[view]
+            stats['requests'] += 1
+            for key in ('latency', 'db', 'serialize', 'queries'):
+                stats[key] += metrics[key]
+            stats['max_queries'] = max(
+                stats['max_queries'], metrics['queries']
+            )
+            stats['max_duplicates'] = max(
+                stats['max_duplicates'], metrics['duplicates']
+            )
+            stats['latency_histogram'][
+                bucket(metrics['latency'], LATENCY_BUCKETS)
+            ] += 1
+            stats['query_histogram'][
+                bucket(metrics['queries'], QUERY_BUCKETS)
+            ] += 1
+            if (monotonic() - self.flushed_at
+                    >= settings.INSTRUMENTATION_FLUSH_INTERVAL):
+                self.flush()
+
+    def flush(self):
+        directory = Path(settings.INSTRUMENTATION_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'{os.getpid()}.json'
+        temporary = path.with_suffix('.tmp')
+        temporary.write_text(json.dumps(self.stats))
+        os.replace(temporary, path)
+        self.flushed_at = monotonic()
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+
+
+recorder = Recorder()
+
+
+def load_report():
+    report = defaultdict(empty_stats)
+    directory = Path(settings.INSTRUMENTATION_DIR)
+    if not directory.exists():
+        return report
+    for path in directory.glob('*.json'):
+        for view, stats in json.loads(path.read_text()).items():
+            merge_stats(report[view], stats)
+    return report
+
+
+def clear_report():
+    recorder.reset()
+    directory = Path(settings.INSTRUMENTATION_DIR)
+    if directory.exists():
+        for path in directory.glob('*.json'):
+            path.unlink()
+
+
+class QueryTimer:
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += perf_counter() - start
+            self.queries += 1
+            self.statements[sql] += 1
+
+
+class InstrumentationMiddleware:
+
+    def __init__(self, get_response):
+        if not settings.INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = perf_counter()
+        timer = QueryTimer()
+        request.instrumentation = {'serialize': 0.0}
+        wrappers = [
+            connection.execute_wrapper(timer)
+            for connection in connections.all()
+        ]
+        for wrapper in wrappers:
+            wrapper.__enter__()
+        try:
+            response = self.get_response(request)
+        finally:
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+        latency = (perf_counter() - start) * 1000
+        db = timer.duration * 1000
+        serialize = request.instrumentation['serialize'] * 1000
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={db:.1f};desc="{timer.queries} queries"',
+            f'serialize;dur={serialize:.1f}',
+            f'app;dur={max(latency - db - serialize, 0):.1f}',
+            f'total;dur={latency:.1f}',
+        ))
+        match = request.resolver_match
+        recorder.record(
+            f'{request.method} {match.view_name if match else "unresolved"}',
+            {
+                'latency': latency,
+                'db': db,
+                'serialize': serialize,
+                'queries': timer.queries,
+                'duplicates': max(timer.statements.values(), default=0),
+            }
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        start = perf_counter()
+
+        def finish(response):
+            request.instrumentation['serialize'] += perf_counter() - start
+
+        response.add_post_render_callback(finish)
+        return response
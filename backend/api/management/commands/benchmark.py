@@ -0,0 +1,119 @@
+from tempfile import TemporaryDirectory
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from api.benchmark import (BENCHMARKS, BenchmarkData, format_table,
+                           run_benchmarks, run_render_benchmarks)
+
+COLUMNS = ('benchmark', 'n', 'p50 ms', 'p95 ms', 'avg ms', 'avg q', 'max q')
+RENDER_COLUMNS = ('payload', 'renderer', 'n', 'p50 ms', 'p95 ms', 'avg ms',
+                  'KiB', 'same')
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Генерирует синтетические данные и замеряет время ответа '
+            'и число запросов к БД для основных эндпоинтов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='favorites per user')
+        parser.add_argument('--cart', type=int, default=10,
+                            help='shopping cart recipes per user')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='subscriptions per user')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--only', nargs='+', choices=BENCHMARKS, default=list(BENCHMARKS),
+            help='benchmarks to run'
+        )
+        parser.add_argument(
+            '--renderers', action='store_true',
+            help='also compare JSON renderers on the ingredient list '
+                 'and a 100-recipe page'
+        )
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='commit generated data instead of rolling it back'
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('Нужно минимум 2 пользователя и 1 рецепт')
+        data = BenchmarkData(
+            users=options['users'],
+            recipes=options['recipes'],
+            ingredients_per_recipe=options['ingredients_per_recipe'],
+            favorites=options['favorites'],
+            cart=options['cart'],
+            subscriptions=options['subscriptions'],
+            seed=options['seed'],
+        )
+        with TemporaryDirectory() as media_root, override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            **({} if options['keep'] else {'MEDIA_ROOT': media_root}),
+        ):
+            try:
+                with transaction.atomic():
+                    self.stdout.write('Генерация данных...')
+                    data.generate()
+                    results = run_benchmarks(
+                        data, options['only'], options['iterations']
+                    )
+                    render_results = (
+                        run_render_benchmarks(data, options['iterations'])
+                        if options['renderers'] else []
+                    )
+                    if not options['keep']:
+                        raise Rollback
+            except Rollback:
+                pass
+            finally:
+                data.reset_indexes()
+        self.report(results)
+        if render_results:
+            self.stdout.write('')
+            self.report_renderers(render_results)
+
+    def report(self, results):
+        self.write_table([COLUMNS] + [
+            (
+                result['name'],
+                str(result['iterations']),
+                f'{result["p50"]:.1f}',
+                f'{result["p95"]:.1f}',
+                f'{result["mean"]:.1f}',
+                f'{result["queries"]:.1f}',
+                str(result['max_queries']),
+            )
+            for result in results
+        ])
+
+    def report_renderers(self, results):
+        self.write_table([RENDER_COLUMNS] + [
+            (
+                result['name'],
+                result['renderer'],
+                str(result['iterations']),
+                f'{result["p50"]:.2f}',
+                f'{result["p95"]:.2f}',
+                f'{result["mean"]:.2f}',
+                f'{result["size"] / 1024:.1f}',
+                'yes' if result['same'] else 'no',
+            )
+            for result in results
+        ])
+
+    def write_table(self, rows):
+        for line in format_table(rows):
+            self.stdout.write(line)
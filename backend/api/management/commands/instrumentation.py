@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+
+from api.benchmark import format_table
+from api.instrumentation import (LATENCY_BUCKETS, QUERY_BUCKETS, clear_report,
+                                 load_report, percentile)
+
+SORT_KEYS = {
+    'total': lambda stats: stats['latency'],
+    'latency': lambda stats: stats['latency'] / stats['requests'],
+    'queries': lambda stats: stats['max_queries'],
+    'requests': lambda stats: stats['requests'],
+}
+COLUMNS = ('view', 'requests', 'p50 ms', 'p95 ms', 'avg ms', 'db ms',
+           'ser ms', 'avg q', 'p95 q', 'max q', 'dup q')
+
+
+class Command(BaseCommand):
+    help = 'Выводит отчёт о числе запросов к БД и времени ответа по view'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sort', choices=SORT_KEYS, default='total',
+            help='sort order'
+        )
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='remove collected statistics'
+        )
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            clear_report()
+            self.stdout.write(self.style.SUCCESS('Статистика очищена'))
+            return
+        report = load_report()
+        if not report:
+            self.stdout.write('Статистика пока не собрана')
+            return
+        rows = [COLUMNS]
+        for view, stats in sorted(
+            report.items(), key=lambda item: SORT_KEYS[options['sort']](
+                item[1]
+            ), reverse=True
+        ):
+            requests = stats['requests']
+            rows.append((
+                view,
+                str(requests),
+                str(percentile(
+                    stats['latency_histogram'], LATENCY_BUCKETS, 0.5
+                )),
+                str(percentile(
+                    stats['latency_histogram'], LATENCY_BUCKETS, 0.95
+                )),
+                f'{stats["latency"] / requests:.1f}',
+                f'{stats["db"] / requests:.1f}',
+                f'{stats["serialize"] / requests:.1f}',
+                f'{stats["queries"] / requests:.1f}',
+                str(percentile(
+                    stats['query_histogram'], QUERY_BUCKETS, 0.95
+                )),
+                str(stats['max_queries']),
+                str(stats['max_duplicates']),
+            ))
+        for line in format_table(rows):
+            self.stdout.write(line)
@@ -0,0 +1,107 @@
+import asyncio
+from time import perf_counter
+from urllib.parse import quote, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmark import format_table, percentile
+
+COLUMNS = ('target', 'requests', 'errors', 'rps', 'p50 ms', 'p95 ms')
+DEFAULT_PATHS = ('/api/recipes/', '/api/tags/', '/api/ingredients/?name=мол')
+
+
+async def fetch(host, port, path, token):
+    reader, writer = await asyncio.open_connection(host, port)
+    headers = [
+        f'GET {quote(path, safe="/?=&")} HTTP/1.1',
+        f'Host: {host}',
+        'Accept: application/json',
+        'Connection: close',
+    ]
+    if token:
+        headers.append(f'Authorization: Token {token}')
+    writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    return int(status_line.split()[1])
+
+
+async def load(target, paths, concurrency, total, token):
+    url = urlsplit(target)
+    prefix = url.path.rstrip('/')
+    latencies = []
+    errors = 0
+    issued = 0
+
+    async def worker():
+        nonlocal errors, issued
+        while issued < total:
+            path = prefix + paths[issued % len(paths)]
+            issued += 1
+            start = perf_counter()
+            try:
+                status = await fetch(
+                    url.hostname, url.port or 80, path, token
+                )
+            except OSError:
+                status = None
+            latencies.append((perf_counter() - start) * 1000)
+            if status is None or status >= 400:
+                errors += 1
+
+    start = perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = perf_counter() - start
+    return {
+        'target': target,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed,
+        'p50': percentile(latencies, 0.5),
+        'p95': percentile(latencies, 0.95),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Нагружает запущенные серверы параллельными GET-запросами, '
+            'например WSGI и ASGI, и сравнивает пропускную способность')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target', action='append', required=True,
+            help='server base URL, can be repeated'
+        )
+        parser.add_argument(
+            '--path', action='append',
+            help=f'request path, can be repeated (default: {DEFAULT_PATHS})'
+        )
+        parser.add_argument('--concurrency', type=int, default=100)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--token', help='auth token')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('Число соединений и запросов должно быть > 0')
+        paths = options['path'] or DEFAULT_PATHS
+        results = [
+            asyncio.run(load(
+                target, paths, options['concurrency'], options['requests'],
+                options['token'],
+            ))
+            for target in options['target']
+        ]
+        rows = [COLUMNS] + [
+            (
+                result['target'],
+                str(result['requests']),
+                str(result['errors']),
+                f'{result["rps"]:.1f}',
+                f'{result["p50"]:.1f}',
+                f'{result["p95"]:.1f}',
+            )
+            for result in results
+        ]
+        for line in format_table(rows):
+            self.stdout.write(line)
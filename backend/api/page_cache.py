@@ -0,0 +1,118 @@
+from hashlib import md5
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from api.cache import get_reference_version, get_tag_slugs
+from recipes.models import Ingredient, Tag
+
+FEED = 'feed'
+
+
+def dependency_key(name):
+    return f'page_dependency:{name}'
+
+
+def get_dependency_versions(names):
+    keys = {dependency_key(name): name for name in names}
+    versions = cache.get_many(keys)
+    missing = {key: uuid4().hex for key in keys.keys() - versions.keys()}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def bump_dependencies(names):
+    cache.set_many(
+        {dependency_key(name): uuid4().hex for name in names}, None
+    )
+
+
+def invalidate_pages(recipe_id=None, author_id=None, tag_ids=(),
+                     feed=False):
+    # Версии меняются после коммита: иначе параллельный запрос успеет
+    # закешировать старые данные уже под новыми версиями.
+    names = [f'tag:{tag_id}' for tag_id in tag_ids]
+    if recipe_id is not None:
+        names.append(f'recipe:{recipe_id}')
+    if author_id is not None:
+        names.append(f'author:{author_id}')
+    if feed:
+        names.append(FEED)
+    if names:
+        transaction.on_commit(lambda: bump_dependencies(names))
+
+
+def normalize_query(query_params):
+    return '&'.join(
+        f'{key}={value}'
+        for key, values in sorted(query_params.lists())
+        for value in sorted(set(values))
+        if value and not (key == 'page' and value == '1')
+    )
+
+
+def filter_dependencies(query_params):
+    names = [f'author:{value}' for value in query_params.getlist('author')]
+    slugs = get_tag_slugs()
+    names += [
+        f'tag:{slugs.get(slug)}' for slug in query_params.getlist('tags')
+    ]
+    return names or [FEED]
+
+
+def content_dependencies(data):
+    recipes = data['results'] if 'results' in data else (data, )
+    names = set()
+    for recipe in recipes:
+        names.add(f'recipe:{recipe["id"]}')
+        names.add(f'author:{recipe["author"]["id"]}')
+    return names
+
+
+class AnonymousPageCacheMixin:
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_page(
+            super().list, filter_dependencies(request.query_params),
+            request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_page(
+            super().retrieve, (), request, *args, **kwargs
+        )
+
+    def cached_page(self, view, dependencies, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return view(request, *args, **kwargs)
+        key = 'page:' + md5(
+            f'{request.path}?{normalize_query(request.query_params)}'.encode()
+        ).hexdigest()
+        references = (
+            get_reference_version(Tag),
+            get_reference_version(Ingredient),
+        )
+        entry = cache.get(key)
+        if entry is not None:
+            data, cached_references, versions = entry
+            if (cached_references == references
+                    and get_dependency_versions(versions) == versions):
+                return Response(data)
+        versions = get_dependency_versions(dependencies)
+        response = view(request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        versions.update(get_dependency_versions(
+            content_dependencies(response.data) - versions.keys()
+        ))
+        cache.set(
+            key, (response.data, references, versions),
+            settings.PAGE_CACHE_TIMEOUT,
+        )
+        return response
@@ -0,0 +1,73 @@
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, JSONParser, MultiPartParser
+
+from api.renderers import FastJSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if (
+            orjson is None or not self.strict
+            or encoding.lower().replace('_', '-') != 'utf-8'
+        ):
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except ValueError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class UploadedFiles(dict):
+    # DRF сливает файлы с данными через dict.update, который у наследников
+    # dict читает хранилище напрямую, поэтому значения — сами файлы. Django
+    # в HttpRequest.close() закрывает файлы через lists(): их отдаём все.
+
+    def __init__(self, files):
+        super().__init__(files.items())
+        self.all_files = dict(files.lists())
+
+    def lists(self):
+        return self.all_files.items()
+
+
+class MultiPartJSONParser(MultiPartParser):
+    json_fields = ('ingredients', 'tags')
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parsed = super().parse(stream, media_type, parser_context)
+        # Данные остаются обычным dict: QueryDict DRF считает HTML-формой
+        # и не увидит в нём вложенные списки из JSON. Повторяющиеся ключи
+        # сохраняются списком.
+        data = {
+            key: values[0] if len(values) == 1 else values
+            for key, values in parsed.data.lists()
+        }
+        for field in self.json_fields:
+            # Список можно передать одним JSON-значением или повторяя ключ
+            # формы: тогда каждая часть — отдельный элемент.
+            try:
+                items = [
+                    json.loads(value)
+                    for value in parsed.data.getlist(field)
+                ]
+            except (TypeError, ValueError):
+                raise ParseError(f'Поле {field} должно содержать JSON')
+            if not items:
+                continue
+            data[field] = (
+                items[0] if len(items) == 1 and isinstance(items[0], list)
+                else items
+            )
+        return DataAndFiles(data, UploadedFiles(parsed.files))
@@ -1,12 +1,19 @@
+from django.conf import settings
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
+from recipes.fulltext import schedule_search_vector_update
+from recipes.matching import schedule_matcher_update
 from recipes.models import (Favorite, Ingredient,
                             Recipe, RecipeIngredient,
-                            RecipeTag, ShoppingCart, Tag)
+                            RecipeTag, ShoppingCart, ShoppingListItem, Tag)
+from recipes.shopping_list import schedule_shopping_list_refresh
 from users.models import User, Subscription
+from api.page_cache import invalidate_pages
+from api.user_state import get_user_state
 
 
 class UserCreateSerializer(UserCreateSerializer):
@@ -39,9 +46,44 @@ class UserSerializer(UserSerializer):
 
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
+        if request is None:
             return False
-        return obj.author.filter(user=request.user.id).exists()
+        return get_user_state(request).is_subscribed(obj.id)
+
+
+class Base64OrFileImageField(Base64ImageField):
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or data in self.EMPTY_VALUES:
+            return super().to_internal_value(data)
+        image = serializers.ImageField.to_internal_value(self, data)
+        extension = image.image.format.lower()
+        extension = 'jpg' if extension == 'jpeg' else extension
+        if extension not in self.ALLOWED_TYPES:
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        image.name = f'{self.get_file_name(image)}.{extension}'
+        return image
+
+
+class ImageVariantsField(serializers.Field):
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        request = self.context.get('request')
+        variants = {}
+        for variant in settings.IMAGE_VARIANTS:
+            image = getattr(recipe, f'image_{variant}') or recipe.image
+            if not image:
+                variants[variant] = None
+            elif request is not None:
+                variants[variant] = request.build_absolute_uri(image.url)
+            else:
+                variants[variant] = image.url
+        return variants
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -72,6 +114,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     ingredients = serializers.SerializerMethodField()
     image = Base64ImageField()
+    images = ImageVariantsField()
     is_favorited = serializers.SerializerMethodField(
         method_name='get_is_favorited'
     )
@@ -90,25 +133,34 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'images',
             'text',
             'cooking_time',
         )
 
     def get_ingredients(self, obj):
-        ingredients = RecipeIngredient.objects.filter(recipe=obj)
-        return RecipeIngredientSerializer(ingredients, many=True).data
+        return RecipeIngredientSerializer(
+            obj.recipe_ingredients.all(), many=True
+        ).data
 
     def get_is_favorited(self, obj):
         request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
+        if request is None:
             return False
-        return obj.favorites.filter(user=request.user.id).exists()
+        return get_user_state(request).is_favorited(obj.id)
 
     def get_is_in_shopping_cart(self, obj):
         request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
+        if request is None:
             return False
-        return obj.shopping_cart.filter(user=request.user.id).exists()
+        return get_user_state(request).is_in_shopping_cart(obj.id)
+
+
+class RecipeMatchSerializer(RecipeSerializer):
+    coverage = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('coverage', )
 
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
@@ -148,10 +200,11 @@ class AddIngredientRecipeSerializer(serializers.ModelSerializer):
 class CreateRecipeSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     ingredients = AddIngredientRecipeSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True
+    # Теги проверяются в validate одним запросом, а не по одному на id.
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), write_only=True
     )
-    image = Base64ImageField()
+    image = Base64OrFileImageField()
 
     class Meta:
         model = Recipe
@@ -174,8 +227,11 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
                                ' или быть пустым!')
             })
         list_ingredients = []
+        existing = Ingredient.objects.in_bulk(
+            [int(ingredient['id']) for ingredient in ingredients]
+        )
         for ingredient in ingredients:
-            if not Ingredient.objects.filter(id=ingredient['id']).exists():
+            if int(ingredient['id']) not in existing:
                 raise serializers.ValidationError({
                     'ingredient': 'Такого ингредиента не существует!'
                 })
@@ -209,25 +265,31 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({
                 'tags': 'Теги повторяются!'
             })
+        existing = Tag.objects.in_bulk(data['tags'])
+        if len(existing) != len(data['tags']):
+            raise serializers.ValidationError({
+                'tags': 'Такого тега не существует!'
+            })
+        data['tags'] = [existing[tag_id] for tag_id in data['tags']]
         return data
 
     def create_ingredients(self, ingredients, recipe):
-        list_ingredients = []
-        for ing in ingredients:
-            ingredient = Ingredient.objects.get(id=ing['id'])
-            list_ingredients.append(RecipeIngredient(
-                ingredient=ingredient,
-                recipe=recipe,
-                amount=ing['amount'],
-            ))
         RecipeIngredient.objects.bulk_create(
-            list_ingredients
+            RecipeIngredient(
+                ingredient_id=ingredient['id'],
+                recipe=recipe,
+                amount=ingredient['amount'],
+            )
+            for ingredient in ingredients
         )
 
     def create_tags(self, tags, recipe):
-        for tag in tags:
-            RecipeTag.objects.create(recipe=recipe, tag=tag)
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag=tag) for tag in tags
+        )
+        invalidate_pages(recipe.id, tag_ids=[tag.id for tag in tags])
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
@@ -237,34 +299,90 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         self.create_tags(tags, recipe)
         return recipe
 
+    def update_ingredients(self, ingredients, recipe):
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        existing = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.recipe_ingredients.all()
+        }
+        removed = existing.keys() - amounts.keys()
+        if removed:
+            recipe.recipe_ingredients.filter(
+                ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, recipe_ingredient in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount', ))
+        added = [
+            {'id': ingredient_id, 'amount': amount}
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        ]
+        if added:
+            self.create_ingredients(added, recipe)
+            schedule_search_vector_update((recipe.id, ))
+            schedule_matcher_update((recipe.id, ))
+        if changed or added:
+            invalidate_pages(recipe.id)
+            schedule_shopping_list_refresh(
+                ingredients=[item.ingredient_id for item in changed]
+                + [item['id'] for item in added],
+                cart_recipes=(recipe.id, ),
+            )
+
+    def update_tags(self, tags, recipe):
+        tags = {tag.id: tag for tag in tags}
+        existing = {tag.id for tag in recipe.tags.all()}
+        removed = existing - tags.keys()
+        if removed:
+            recipe.recipe_tags.filter(tag_id__in=removed).delete()
+        added = [tag for tag_id, tag in tags.items() if tag_id not in existing]
+        if added:
+            self.create_tags(added, recipe)
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.recipe_tags.clear()
-        instance.recipe_ingredients.clear()
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        self.create_ingredients(ingredients, instance)
-        self.create_tags(tags, instance)
-        instance.name = validated_data.pop('name')
-        instance.text = validated_data.pop('text')
-        if validated_data.get('image'):
-            instance.image = validated_data.pop('image')
-        instance.cooking_time = validated_data.pop('cooking_time')
-        instance.save()
+        self.update_ingredients(validated_data.pop('ingredients'), instance)
+        self.update_tags(validated_data.pop('tags'), instance)
+        update_fields = []
+        for field, value in validated_data.items():
+            if field == 'image' and not value:
+                continue
+            if getattr(instance, field) != value:
+                setattr(instance, field, value)
+                update_fields.append(field)
+        if update_fields:
+            instance.save(update_fields=update_fields)
         return instance
 
     def to_representation(self, instance):
+        request = self.context.get('request')
+        instance = Recipe.objects.select_related(
+            'author'
+        ).with_related().get(pk=instance.pk)
         return RecipeSerializer(instance, context={
-            'request': self.context.get('request')
+            'request': request
         }).data
 
 
 class ShowFavoriteSerializer(serializers.ModelSerializer):
+    images = ImageVariantsField()
+
     class Meta:
         model = Recipe
         fields = (
             'id',
             'name',
             'image',
+            'images',
             'cooking_time',
         )
 
@@ -292,6 +410,14 @@ class ShoppingCartSerializer(ShoppingCartandFavorite):
         return value
 
 
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient_id')
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
 class FavoriteSerializer(ShoppingCartandFavorite):
 
     class Meta(ShoppingCartandFavorite.Meta):
@@ -304,9 +430,25 @@ class FavoriteSerializer(ShoppingCartandFavorite):
         return value
 
 
+def get_recipes_limit(request):
+    limit = request.query_params.get('recipes_limit')
+    if limit is None:
+        return None
+    # isdigit() пропускает символы вроде '²', которые int() не разберёт.
+    try:
+        limit = int(limit)
+    except ValueError:
+        limit = -1
+    if limit < 0:
+        raise serializers.ValidationError({
+            'recipes_limit': 'Должно быть целым неотрицательным числом'
+        })
+    return limit
+
+
 class ShowSubscriptionsSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta(UserSerializer.Meta):
         fields = (
@@ -324,17 +466,17 @@ class ShowSubscriptionsSerializer(UserSerializer):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
-        limit = request.query_params.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if limit:
-            recipes = recipes[:int(limit)]
+        if hasattr(obj, 'recipe_previews'):
+            recipes = obj.recipe_previews
+        else:
+            recipes = obj.recipes.all()
+            limit = get_recipes_limit(request)
+            if limit is not None:
+                recipes = recipes[:limit]
         return ShowFavoriteSerializer(
             recipes, many=True, context={'request': request}
         ).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
 
 class SubscriptionSerializer(serializers.ModelSerializer):
 
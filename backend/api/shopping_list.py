@@ -0,0 +1,100 @@
+import csv
+from io import BytesIO
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from reportlab.pdfgen import canvas
+
+TITLE = 'Список покупок'
+PDF_FONT = 'ShoppingListFont'
+PDF_FONT_SIZE = 12
+PDF_MARGIN = 50
+PDF_CHUNK_SIZE = 64 * 1024
+
+registered_fonts = {}
+
+
+class PDFFontUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Список покупок в PDF недоступен: шрифт не найден'
+
+
+def format_line(ingredient):
+    return (
+        f'{ingredient["name"]} - {ingredient["amount"]} '
+        f'{ingredient["measurement_unit"]}'
+    )
+
+
+def render_txt(ingredients):
+    yield f'{TITLE}:\n'
+    for ingredient in ingredients:
+        yield f'{format_line(ingredient)}\n'
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def render_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Количество', 'Единица измерения'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['name'],
+            ingredient['amount'],
+            ingredient['measurement_unit'],
+        ))
+
+
+def register_pdf_font():
+    path = settings.SHOPPING_LIST_FONT
+    if path not in registered_fonts:
+        name = f'{PDF_FONT}{len(registered_fonts)}'
+        try:
+            pdfmetrics.registerFont(TTFont(name, path))
+        except TTFError:
+            raise PDFFontUnavailable
+        registered_fonts[path] = name
+    return registered_fonts[path]
+
+
+def render_pdf(ingredients):
+    # Шрифт регистрируется до начала ответа: ошибка внутри генератора
+    # оборвала бы уже отправленный 200.
+    return pdf_chunks(ingredients, register_pdf_font())
+
+
+def pdf_chunks(ingredients, font):
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    pdf.setTitle(TITLE)
+    width, height = A4
+    line_height = PDF_FONT_SIZE * 1.5
+    pdf.setFont(font, PDF_FONT_SIZE * 1.5)
+    pdf.drawString(PDF_MARGIN, height - PDF_MARGIN, TITLE)
+    pdf.setFont(font, PDF_FONT_SIZE)
+    y = height - PDF_MARGIN - line_height * 2
+    for num, ingredient in enumerate(ingredients, start=1):
+        if y < PDF_MARGIN:
+            pdf.showPage()
+            pdf.setFont(font, PDF_FONT_SIZE)
+            y = height - PDF_MARGIN
+        pdf.drawString(PDF_MARGIN, y, f'{num}. {format_line(ingredient)}')
+        y -= line_height
+    pdf.save()
+    buffer.seek(0)
+    yield from iter(lambda: buffer.read(PDF_CHUNK_SIZE), b'')
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': (render_txt, 'text/plain; charset=utf-8'),
+    'csv': (render_csv, 'text/csv; charset=utf-8'),
+    'pdf': (render_pdf, 'application/pdf'),
+}
+DEFAULT_FORMAT = 'pdf'
@@ -0,0 +1,109 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from api.authentication import invalidate_tokens, invalidate_user_tokens
+from api.cache import bump_reference_version
+from api.documents import (rebuild_all_recipe_documents,
+                           schedule_document_update)
+from api.page_cache import invalidate_pages
+from api.user_state import invalidate_user_state
+from recipes.events import recipe_images_ready, recounted, references_loaded
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, ShoppingCart, Tag)
+from users.models import Subscription, User
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver(references_loaded)
+def invalidate_reference_cache(sender, **kwargs):
+    bump_reference_version(sender)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Subscription)
+def invalidate_user_state_cache(sender, instance, **kwargs):
+    invalidate_user_state(sender, instance.user_id)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token_cache(instance, **kwargs):
+    invalidate_tokens((instance.key, ))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_caches(instance, created, update_fields, **kwargs):
+    if created or update_fields is not None and (
+        set(update_fields) <= {'last_login'}
+    ):
+        return
+    invalidate_user_tokens(instance.pk)
+    invalidate_pages(author_id=instance.pk)
+    schedule_document_update(
+        Recipe.objects.filter(author=instance).values_list('id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_saved_recipe_pages(instance, created, **kwargs):
+    if created:
+        invalidate_pages(instance.pk, instance.author_id, feed=True)
+    else:
+        invalidate_pages(instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def invalidate_deleted_recipe_pages(instance, **kwargs):
+    invalidate_pages(instance.pk, instance.author_id, feed=True)
+
+
+@receiver((post_save, post_delete), sender=RecipeTag)
+def invalidate_recipe_tag_pages(instance, **kwargs):
+    invalidate_pages(instance.recipe_id, tag_ids=(instance.tag_id, ))
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipe_ingredient_pages(instance, **kwargs):
+    invalidate_pages(instance.recipe_id)
+
+
+@receiver(post_save, sender=Recipe)
+def build_recipe_document(instance, created, **kwargs):
+    if created:
+        schedule_document_update((instance.pk, ))
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver((post_save, post_delete), sender=RecipeTag)
+def update_recipe_document(instance, **kwargs):
+    if instance.recipe_id is not None:
+        schedule_document_update((instance.recipe_id, ))
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_documents(instance, created, **kwargs):
+    if not created:
+        schedule_document_update(instance.recipeingredient_set.values_list(
+            'recipe_id', flat=True
+        ))
+
+
+@receiver(post_save, sender=Tag)
+def update_tag_documents(instance, created, **kwargs):
+    if not created:
+        schedule_document_update(RecipeTag.objects.filter(
+            tag=instance
+        ).values_list('recipe_id', flat=True))
+
+
+@receiver(recipe_images_ready)
+def invalidate_recipe_image_pages(recipe_id, **kwargs):
+    invalidate_pages(recipe_id)
+
+
+@receiver(recounted)
+def rebuild_documents_on_recount(**kwargs):
+    rebuild_all_recipe_documents()
@@ -1,6 +1,52 @@
+import base64
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, timezone
+from decimal import Decimal
 from http import HTTPStatus
+from importlib import import_module
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
+from urllib.parse import urlencode
 
-from django.test import Client, TestCase
+from asgiref.sync import async_to_sync
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from django.utils.translation import gettext_lazy
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api.async_views import async_read_view
+from api.authentication import token_cache_key, token_users
+from api.cache import reference_version_key
+from api.documents import build_document, rebuild_recipe_documents
+from api.parsers import FastJSONParser, MultiPartJSONParser
+from api.renderers import FastJSONRenderer
+from api.serializers import RecipeSerializer
+from api.views import RecipeViewSet, TagViewSet
+from recipes.fulltext import pending_search_vectors, update_search_vectors
+from recipes.matching import pending_matcher_updates, recipe_matcher
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeDocument,
+                            RecipeIngredient, RecipeTag, ShoppingCart,
+                            ShoppingListItem, Tag)
+from recipes.search import ingredient_index
+from users.models import Subscription, User
 
 
 class FoodgramAPITestCase(TestCase):
@@ -16,3 +62,1796 @@ class FoodgramAPITestCase(TestCase):
         """Проверка доступности списка ингредиентов."""
         response = self.guest_client.get('/api/ingredients/')
         self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class RecipeQueryCountTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass',
+            first_name='Читатель', last_name='Читателев',
+        )
+        tags = [
+            Tag.objects.create(
+                name=f'Тег {i}', color='#FF0000', slug=f'tag{i}'
+            )
+            for i in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(5)
+        ]
+        for i in range(10):
+            author = User.objects.create_user(
+                username=f'author{i}', email=f'author{i}@example.com',
+                password='pass', first_name='Автор', last_name=str(i),
+            )
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {i}', text='Текст',
+                cooking_time=10,
+            )
+            for tag in tags:
+                RecipeTag.objects.create(recipe=recipe, tag=tag)
+            for ingredient in ingredients:
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=i + 1
+                )
+            if i % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+                Subscription.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def count_queries(self, client, url):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return len(context.captured_queries), response.json()
+
+    def test_recipe_list_queries_do_not_grow(self):
+        """Число запросов к БД не зависит от размера страницы."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for test_client in (client, APIClient()):
+            self.count_queries(test_client, '/api/recipes/?limit=1')
+            small, _ = self.count_queries(
+                test_client, '/api/recipes/?limit=2'
+            )
+            large, _ = self.count_queries(
+                test_client, '/api/recipes/?limit=10'
+            )
+            self.assertEqual(small, large)
+
+    def test_recipe_list_user_flags(self):
+        """Флаги избранного, корзины и подписки вычисляются верно."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        _, data = self.count_queries(client, '/api/recipes/?limit=10')
+        for recipe in data['results']:
+            expected = int(recipe['name'].split()[-1]) % 2 == 1
+            self.assertEqual(recipe['is_favorited'], expected)
+            self.assertEqual(recipe['is_in_shopping_cart'], expected)
+            self.assertEqual(recipe['author']['is_subscribed'], expected)
+            self.assertEqual(len(recipe['ingredients']), 5)
+            self.assertEqual(len(recipe['tags']), 3)
+        _, data = self.count_queries(
+            client, '/api/recipes/?limit=10&is_favorited=1'
+        )
+        self.assertEqual(data['count'], 5)
+
+    def test_user_state_invalidated(self):
+        """Флаги пользователя обновляются после изменения избранного."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        recipe = Recipe.objects.get(name='Рецепт 0')
+        url = f'/api/recipes/{recipe.id}/'
+        self.assertFalse(client.get(url).json()['is_favorited'])
+        with self.assertNumQueries(1):
+            client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(f'{url}favorite/')
+        self.assertTrue(client.get(url).json()['is_favorited'])
+        with self.captureOnCommitCallbacks(execute=True):
+            client.delete(f'{url}favorite/')
+            # До коммита кеш хранит прежний набор id.
+            self.assertTrue(client.get(url).json()['is_favorited'])
+        self.assertFalse(client.get(url).json()['is_favorited'])
+
+    def test_tags_filter_without_duplicates(self):
+        """Рецепт с несколькими выбранными тегами выводится один раз."""
+        client = APIClient()
+        self.count_queries(client, '/api/recipes/?limit=20&tags=tag0')
+        count, data = self.count_queries(
+            client, '/api/recipes/?limit=20&tags=tag0&tags=tag1&tags=tag2'
+        )
+        self.assertEqual(data['count'], 10)
+        self.assertEqual(len(data['results']), 10)
+        self.assertEqual(
+            count, self.count_queries(client, '/api/recipes/?limit=20')[0]
+        )
+        response = client.get('/api/recipes/?tags=unknown')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_cursor_pagination(self):
+        """Курсорная пагинация обходит ленту без COUNT-запроса."""
+        client = APIClient()
+        names = []
+        url = '/api/recipes/?cursor=&limit=4'
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(url)
+            self.assertNotIn('count', response.json())
+            self.assertFalse(any(
+                'COUNT(' in query['sql'].upper()
+                for query in context.captured_queries
+            ))
+            names += [recipe['name'] for recipe in response.json()['results']]
+            url = response.json()['next']
+        self.assertEqual(names, [f'Рецепт {i}' for i in range(9, -1, -1)])
+
+
+class ShoppingListDownloadTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='pass',
+            first_name='Покупатель', last_name='Покупателев',
+        )
+        ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(3)
+        ]
+        with cls.captureOnCommitCallbacks(execute=True):
+            for i in range(2):
+                recipe = Recipe.objects.create(
+                    author=cls.user, name=f'Рецепт {i}', text='Текст',
+                    cooking_time=10,
+                )
+                for ingredient in ingredients:
+                    RecipeIngredient.objects.create(
+                        recipe=recipe, ingredient=ingredient, amount=10
+                    )
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self, file_format):
+        response = self.client.get(
+            f'/api/recipes/download_shopping_cart/?format={file_format}'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_download_formats(self):
+        """Список покупок суммируется и выгружается в txt, csv и pdf."""
+        content = self.download('txt').decode()
+        self.assertIn('Ингредиент 0 - 20 г', content)
+        content = self.download('csv').decode()
+        self.assertIn('Ингредиент 2,20,г', content)
+        self.assertTrue(self.download('pdf').startswith(b'%PDF'))
+
+    def test_download_unknown_format(self):
+        """Неизвестный формат выгрузки отклоняется."""
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/?format=doc'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    @override_settings(SHOPPING_LIST_FONT='/nonexistent/font.ttf')
+    def test_download_pdf_without_font(self):
+        """Без шрифта PDF не отдаётся, а возвращается ошибка."""
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/?format=pdf'
+        )
+        self.assertEqual(
+            response.status_code, HTTPStatus.SERVICE_UNAVAILABLE
+        )
+        self.assertFalse(response.streaming)
+
+    def test_recount_rebuilds_shopping_list(self):
+        """Команда recount восстанавливает список покупок."""
+        ShoppingListItem.objects.all().delete()
+        call_command('recount', stdout=StringIO())
+        self.assertIn('Ингредиент 0 - 20 г', self.download('txt').decode())
+
+    def test_download_anonymous(self):
+        """Аноним не может скачать список покупок."""
+        response = APIClient().get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    def shopping_list(self):
+        response = self.client.get('/api/recipes/shopping_list/')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return {item['name']: item['amount'] for item in response.json()}
+
+    def test_shopping_list_follows_changes(self):
+        """Список покупок обновляется при изменении корзины и рецептов."""
+        first, second = Recipe.objects.order_by('id')
+        self.assertEqual(self.shopping_list(), {
+            f'Ингредиент {i}': 20 for i in range(3)
+        })
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/recipes/{first.id}/shopping_cart/')
+        self.assertEqual(self.shopping_list()['Ингредиент 0'], 10)
+        ingredient = Ingredient.objects.get(name='Ингредиент 0')
+        tag = Tag.objects.create(name='Обед', color='#00FF00', slug='lunch')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/recipes/{second.id}/', {
+                'ingredients': [{'id': ingredient.id, 'amount': 7}],
+                'tags': [tag.id],
+                'name': second.name,
+                'text': second.text,
+                'cooking_time': second.cooking_time,
+            }, format='json')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(self.shopping_list(), {'Ингредиент 0': 7})
+        ingredient.name = 'Мука'
+        ingredient.save()
+        self.assertEqual(self.shopping_list(), {'Мука': 7})
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(self.shopping_list(), {})
+
+
+class ShoppingListTransactionTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='pass',
+            first_name='Покупатель', last_name='Покупателев',
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Суп', text='Текст', cooking_time=10
+        )
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, amount=10,
+            ingredient=Ingredient.objects.create(
+                name='Соль', measurement_unit='г'
+            ),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_lock_outside_transaction(self):
+        """Блокировка списка покупок работает и в режиме autocommit."""
+        # SQLite не знает FOR UPDATE, поэтому ветку с блокировкой
+        # включаем вручную, убирая сам SQL-суффикс.
+        with mock.patch.object(
+            connection.features, 'has_select_for_update', True
+        ), mock.patch.object(
+            connection.ops, 'for_update_sql', return_value=''
+        ):
+            response = self.client.post(
+                f'/api/recipes/{self.recipe.id}/shopping_cart/'
+            )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(
+            list(self.user.shopping_list.values_list('name', 'amount')),
+            [('Соль', 10)],
+        )
+
+    def test_failed_delete_leaves_no_state(self):
+        """Откат удаления пользователя не мешает следующим пересчётам."""
+        def fail(**kwargs):
+            raise DatabaseError('Сбой удаления')
+
+        post_delete.connect(fail, sender=Recipe)
+        try:
+            with self.assertRaises(DatabaseError):
+                self.user.delete()
+        finally:
+            post_delete.disconnect(fail, sender=Recipe)
+        response = self.client.post(
+            f'/api/recipes/{self.recipe.id}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(
+            list(self.user.shopping_list.values_list('name', 'amount')),
+            [('Соль', 10)],
+        )
+
+
+class IngredientSearchTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('сахар', 'сахарная пудра', 'ванильный сахар', 'соль'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def setUp(self):
+        cache.clear()
+        ingredient_index.invalidate()
+
+    def search(self, name):
+        response = self.client.get(f'/api/ingredients/?name={name}')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def test_prefix_matches_go_first(self):
+        """Совпадения по началу названия идут раньше вхождений."""
+        self.assertEqual(
+            self.search('Сах'), ['сахар', 'сахарная пудра', 'ванильный сахар']
+        )
+
+    def test_index_refreshes_on_change(self):
+        """Новый ингредиент сразу находится поиском."""
+        self.search('со')
+        Ingredient.objects.create(name='соевый соус', measurement_unit='мл')
+        self.assertEqual(self.search('со'), ['соевый соус', 'соль'])
+
+    def test_rebuild_replaces_whole_index(self):
+        """Пересборка подменяет ключи и ингредиенты вместе."""
+        self.search('со')
+        index = ingredient_index.index
+        keys = list(index[0])
+        Ingredient.objects.create(name='соевый соус', measurement_unit='мл')
+        self.search('со')
+        self.assertIsNot(ingredient_index.index, index)
+        self.assertEqual(index[0], keys)
+        self.assertEqual(len(index[0]), len(index[1]))
+
+
+class ReferenceCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_not_modified(self):
+        """Повторный запрос с ETag получает 304 без обращения к БД."""
+        response = self.client.get('/api/tags/')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                '/api/tags/', HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/tags/')
+        self.assertEqual(response.json()[0]['slug'], 'breakfast')
+
+    def test_invalidated_on_change(self):
+        """Изменение тега сбрасывает кеш и ETag."""
+        etag = self.client.get('/api/tags/')['ETag']
+        self.tag.name = 'Завтраки'
+        self.tag.save()
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()[0]['name'], 'Завтраки')
+
+    def test_etag_survives_cache_expiry(self):
+        """После истечения кеша неизменённые данные сохраняют ETag."""
+        response = self.client.get('/api/tags/')
+        cache.delete(reference_version_key(Tag))
+        response = self.client.get(
+            '/api/tags/', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_etag_depends_on_media_type(self):
+        """JSON и browsable API получают разные ETag и Vary: Accept."""
+        response = self.client.get('/api/tags/')
+        self.assertIn('Accept', response['Vary'])
+        html = self.client.get('/api/tags/', HTTP_ACCEPT='text/html')
+        self.assertEqual(html.status_code, HTTPStatus.OK)
+        self.assertNotEqual(html['ETag'], response['ETag'])
+        html = self.client.get(
+            '/api/tags/', HTTP_ACCEPT='text/html',
+            HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(html.status_code, HTTPStatus.OK)
+
+
+class LoadModelsTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def load(self, path, **options):
+        out = StringIO()
+        call_command('loadmodels', path=path, stdout=out, **options)
+        return out.getvalue()
+
+    def ingredients(self):
+        return set(Ingredient.objects.values_list('name', 'measurement_unit'))
+
+    def test_json_split_across_chunks(self):
+        """Записи, разрезанные границей чанка, читаются целиком."""
+        path = self.write('ingredients.json', json.dumps([
+            {'name': 'Мука пшеничная', 'measurement_unit': 'г'},
+            {'name': 'Молоко', 'measurement_unit': 'мл'},
+            {'name': 'Яйцо', 'measurement_unit': 'шт.'},
+        ], ensure_ascii=False, indent=2))
+        with mock.patch(
+            'recipes.management.commands.loadmodels.CHUNK_SIZE', 7
+        ):
+            self.load(path, batch_size=2)
+        self.assertEqual(self.ingredients(), {
+            ('Мука пшеничная', 'г'), ('Молоко', 'мл'), ('Яйцо', 'шт.'),
+        })
+
+    def test_invalid_json(self):
+        """Обрезанный JSON приводит к ошибке команды."""
+        path = self.write('broken.json', '[{"name": "Мука", "measu')
+        with self.assertRaises(CommandError):
+            self.load(path)
+
+    def test_csv(self):
+        """Ингредиенты и теги загружаются из CSV."""
+        self.load(self.write('ingredients.csv', 'Мука,г\nМолоко,мл\n'))
+        self.assertEqual(self.ingredients(), {('Мука', 'г'), ('Молоко', 'мл')})
+        cache.clear()
+        self.assertEqual(self.client.get('/api/tags/').json(), [])
+        self.load(self.write('tags.csv', 'Завтрак,#E26C2D,breakfast\n'))
+        self.assertTrue(Tag.objects.filter(
+            slug='breakfast', name='Завтрак', color='#E26C2D'
+        ).exists())
+        self.assertEqual(
+            self.client.get('/api/tags/').json()[0]['slug'], 'breakfast'
+        )
+
+    def test_dry_run(self):
+        """Пробный запуск ничего не сохраняет."""
+        path = self.write('ingredients.csv', 'Мука,г\nМолоко,мл\n')
+        out = self.load(path, dry_run=True)
+        self.assertIn('найдено 2 записей', out)
+        self.assertFalse(Ingredient.objects.exists())
+
+    def test_rerun_is_idempotent(self):
+        """Повторная загрузка не создаёт дубликатов."""
+        path = self.write('ingredients.json', json.dumps([
+            {'name': 'Мука', 'measurement_unit': 'г'},
+            {'name': 'Мука', 'measurement_unit': 'г'},
+            {'name': 'Соль', 'measurement_unit': 'г'},
+        ], ensure_ascii=False))
+        self.assertIn('Загружено 2 новых', self.load(path))
+        self.assertIn('Загружено 0 новых', self.load(path))
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+
+SMALL_GIF = (
+    'data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAI'
+    'BRAA7'
+)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class RecipeCreateTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cook', email='cook@example.com', password='pass',
+            first_name='Повар', last_name='Поваров',
+        )
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {i}', color='#FF0000', slug=f'tag{i}'
+            )
+            for i in range(2)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(30)
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def recipe_data(self, ingredients):
+        return {
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 5}
+                for ingredient in ingredients
+            ],
+            'tags': [tag.id for tag in self.tags],
+            'image': SMALL_GIF,
+            'name': 'Большой рецепт',
+            'text': 'Описание',
+            'cooking_time': 30,
+        }
+
+    def test_create_queries_do_not_depend_on_ingredients(self):
+        """Число запросов при создании не зависит от числа ингредиентов."""
+        counts = []
+        for size in (1, 30):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(
+                    '/api/recipes/',
+                    self.recipe_data(self.ingredients[:size]),
+                    format='json',
+                )
+            self.assertEqual(response.status_code, HTTPStatus.CREATED)
+            self.assertEqual(len(response.json()['ingredients']), size)
+            counts.append(len(context.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_create_unknown_ingredient(self):
+        """Несуществующий ингредиент не создаёт рецепт."""
+        data = self.recipe_data(self.ingredients[:2])
+        data['ingredients'].append({'id': 10 ** 6, 'amount': 1})
+        response = self.client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_create_unknown_tag(self):
+        """Несуществующий тег не создаёт рецепт."""
+        data = self.recipe_data(self.ingredients[:2])
+        data['tags'].append(10 ** 6)
+        response = self.client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('tags', response.json())
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_create_queries_do_not_depend_on_tags(self):
+        """Число запросов при создании не зависит от числа тегов."""
+        data = self.recipe_data(self.ingredients[:2])
+        data['tags'] = data['tags'][:1]
+        with CaptureQueriesContext(connection) as one:
+            self.client.post('/api/recipes/', data, format='json')
+        data = self.recipe_data(self.ingredients[:2])
+        with CaptureQueriesContext(connection) as two:
+            response = self.client.post('/api/recipes/', data, format='json')
+        self.assertEqual(len(response.json()['tags']), 2)
+        self.assertEqual(
+            len(one.captured_queries), len(two.captured_queries)
+        )
+
+    def test_update_writes_only_changes(self):
+        """Обновление меняет только изменившиеся строки."""
+        response = self.client.post(
+            '/api/recipes/', self.recipe_data(self.ingredients[:3]),
+            format='json',
+        )
+        recipe = Recipe.objects.get(id=response.json()['id'])
+        kept_ids = set(recipe.recipe_ingredients.filter(
+            ingredient__in=self.ingredients[:2]
+        ).values_list('id', flat=True))
+        data = self.recipe_data(self.ingredients[:2] + self.ingredients[5:6])
+        data['ingredients'][0]['amount'] = 7
+        data['tags'] = [self.tags[0].id]
+        data['name'] = 'Новое название'
+        del data['image']
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/', data, format='json'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['name'], 'Новое название')
+        self.assertEqual(
+            {ingredient['id']: ingredient['amount']
+             for ingredient in response.json()['ingredients']},
+            {self.ingredients[0].id: 7, self.ingredients[1].id: 5,
+             self.ingredients[5].id: 5},
+        )
+        self.assertEqual(len(response.json()['tags']), 1)
+        self.assertTrue(kept_ids <= set(recipe.recipe_ingredients.values_list(
+            'id', flat=True
+        )))
+        self.assertFalse(RecipeIngredient.objects.filter(
+            recipe__isnull=True
+        ).exists())
+
+    @override_settings(IMAGE_PROCESSING='sync')
+    def test_image_variants(self):
+        """После сохранения рецепта создаются уменьшенные WebP-копии."""
+        buffer = BytesIO()
+        Image.new('RGB', (1600, 1600), 'red').save(buffer, 'PNG')
+        data = self.recipe_data(self.ingredients[:1])
+        data['image'] = (
+            'data:image/png;base64,'
+            f'{base64.b64encode(buffer.getvalue()).decode()}'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        recipe = Recipe.objects.get(id=response.json()['id'])
+        with Image.open(recipe.image_card.path) as image:
+            self.assertEqual(image.format, 'WEBP')
+            self.assertEqual(image.size, (400, 400))
+        response = self.client.get(f'/api/recipes/{recipe.id}/')
+        self.assertTrue(
+            response.json()['images']['detail'].endswith('_detail.webp')
+        )
+
+    @override_settings(IMAGE_PROCESSING='sync')
+    def test_image_metadata_and_old_variants(self):
+        """EXIF удаляется из оригинала, копии старой картинки удаляются."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x8825] = {1: 'N'}
+        buffer = BytesIO()
+        Image.new('RGB', (200, 100), 'red').save(
+            buffer, 'JPEG', exif=exif.tobytes()
+        )
+        data = self.recipe_data(self.ingredients[:1])
+        data['image'] = (
+            'data:image/jpeg;base64,'
+            f'{base64.b64encode(buffer.getvalue()).decode()}'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/recipes/', data, format='json')
+        recipe = Recipe.objects.get(id=response.json()['id'])
+        with Image.open(recipe.image.path) as image:
+            self.assertFalse(image.getexif())
+            self.assertEqual(image.size, (100, 200))
+        old_variant = recipe.image_card.path
+        data['image'] = SMALL_GIF
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                f'/api/recipes/{recipe.id}/', data, format='json'
+            )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        recipe.refresh_from_db()
+        self.assertFalse(os.path.exists(old_variant))
+        self.assertTrue(os.path.exists(recipe.image_card.path))
+
+    def multipart_data(self, size):
+        buffer = BytesIO()
+        Image.new('RGB', (size, size), 'green').save(buffer, 'PNG')
+        data = self.recipe_data(self.ingredients[:2])
+        data['image'] = SimpleUploadedFile(
+            'photo.png', buffer.getvalue(), content_type='image/png'
+        )
+        data['ingredients'] = json.dumps(data['ingredients'])
+        data['tags'] = json.dumps(data['tags'])
+        return data
+
+    def test_create_multipart(self):
+        """Рецепт можно создать через multipart/form-data."""
+        response = self.client.post(
+            '/api/recipes/', self.multipart_data(50), format='multipart'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(len(response.json()['ingredients']), 2)
+        self.assertTrue(response.json()['image'].endswith('.png'))
+        self.assertNotIn('photo', response.json()['image'])
+
+    def test_create_multipart_repeated_keys(self):
+        """Списки в multipart можно передать повторяющимися ключами."""
+        data = self.multipart_data(50)
+        data['tags'] = [str(tag.id) for tag in self.tags]
+        data['ingredients'] = [
+            json.dumps(ingredient)
+            for ingredient in json.loads(data['ingredients'])
+        ]
+        response = self.client.post('/api/recipes/', data, format='multipart')
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(len(response.json()['tags']), len(self.tags))
+        self.assertEqual(len(response.json()['ingredients']), 2)
+        data = self.multipart_data(50)
+        data['tags'] = ['1', '{']
+        response = self.client.post('/api/recipes/', data, format='multipart')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_multipart_parser_keeps_files_closable(self):
+        """Парсер сохраняет повторные ключи, а Django закрывает файлы."""
+        django_request = APIRequestFactory().post('/api/recipes/', {
+            'name': ['Первый', 'Второй'],
+            'tags': '[1, 2]',
+            'image': SimpleUploadedFile('photo.png', b'png'),
+        }, format='multipart')
+        request = Request(
+            django_request, parsers=[MultiPartJSONParser()]
+        )
+        self.assertEqual(request.data['name'], ['Первый', 'Второй'])
+        self.assertEqual(request.data['tags'], [1, 2])
+        image = request.data['image']
+        self.assertEqual(image.read(), b'png')
+        django_request.close()
+        self.assertTrue(image.closed)
+
+    @override_settings(MAX_UPLOAD_SIZE=1024)
+    def test_multipart_size_limit(self):
+        """Слишком большой файл отклоняется во время загрузки."""
+        response = self.client.post(
+            '/api/recipes/', self.multipart_data(500), format='multipart'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+
+class CountersTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass',
+            first_name='Автор', last_name='Авторов',
+        )
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass',
+            first_name='Читатель', last_name='Читателев',
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Текст', cooking_time=5
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def test_counters_follow_changes(self):
+        """Счётчики обновляются при добавлении и удалении записей."""
+        self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.author.subscribers_count, 1)
+        self.assertEqual(self.author.recipes_count, 1)
+        self.client.delete(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.client.delete(f'/api/users/{self.author.id}/subscribe/')
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+        self.assertEqual(self.author.subscribers_count, 0)
+
+    def test_recount_command(self):
+        """Команда recount восстанавливает счётчики."""
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        Recipe.objects.update(favorites_count=10)
+        User.objects.update(recipes_count=0)
+        call_command('recount', stdout=StringIO())
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.author.recipes_count, 1)
+
+    def test_full_save_keeps_counters(self):
+        """Сохранение устаревшего объекта не затирает счётчики."""
+        token = Token.objects.create(user=self.author)
+        author_client = APIClient()
+        author_client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        author_client.get('/api/users/me/')
+        self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        response = author_client.post('/api/users/set_password/', {
+            'current_password': 'pass', 'new_password': 'Tq3v-new-pass',
+        })
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.recipe.name = 'Новое название'
+        self.recipe.save()
+        self.author.refresh_from_db()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 1)
+        self.assertEqual(self.author.recipes_count, 1)
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertTrue(self.author.check_password('Tq3v-new-pass'))
+
+
+class SubscriptionsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass',
+            first_name='Читатель', last_name='Читателев',
+        )
+        for i in range(4):
+            author = User.objects.create_user(
+                username=f'author{i}', email=f'author{i}@example.com',
+                password='pass', first_name='Автор', last_name=str(i),
+            )
+            for j in range(i * 3):
+                Recipe.objects.create(
+                    author=author, name=f'Рецепт {i}-{j}', text='Текст',
+                    cooking_time=5,
+                )
+            Subscription.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def test_subscriptions_recipe_previews(self):
+        """Подписки отдают ограниченные превью рецептов за один запрос."""
+        self.client.get('/api/users/subscriptions/')
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                '/api/users/subscriptions/?recipes_limit=2'
+            )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        for author in response.json()['results']:
+            recipes_count = int(author['last_name']) * 3
+            self.assertTrue(author['is_subscribed'])
+            self.assertEqual(author['recipes_count'], recipes_count)
+            self.assertEqual(len(author['recipes']), min(2, recipes_count))
+            if recipes_count:
+                self.assertEqual(
+                    author['recipes'][0]['name'],
+                    f'Рецепт {author["last_name"]}-{recipes_count - 1}'
+                )
+
+    def test_invalid_recipes_limit(self):
+        """Некорректный recipes_limit отклоняется."""
+        for limit in ('abc', '-1', '²'):
+            response = self.client.get(
+                f'/api/users/subscriptions/?recipes_limit={limit}'
+            )
+            self.assertEqual(
+                response.status_code, HTTPStatus.BAD_REQUEST, limit
+            )
+
+
+class RecipeSearchTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass',
+            first_name='Автор', last_name='Авторов',
+        )
+        cls.recipes = {}
+        for name, text in (
+            ('Борщ', 'Сварить свёклу'),
+            ('Салат', 'Нарезать огурцы, добавить борщевую заправку'),
+            ('Компот', 'Сварить ягоды'),
+        ):
+            cls.recipes[name] = Recipe.objects.create(
+                author=author, name=name, text=text, cooking_time=10
+            )
+        beet = Ingredient.objects.create(name='свёкла', measurement_unit='г')
+        RecipeIngredient.objects.create(
+            recipe=cls.recipes['Борщ'], ingredient=beet, amount=1
+        )
+        update_search_vectors(recipe.id for recipe in cls.recipes.values())
+
+    def search(self, query):
+        response = self.client.get(f'/api/recipes/?search={query}')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [recipe['name'] for recipe in response.json()['results']]
+
+    def test_search_ranks_name_first(self):
+        """Совпадение в названии ранжируется выше совпадения в тексте."""
+        self.assertEqual(self.search('борщ'), ['Борщ', 'Салат'])
+
+    def test_search_by_ingredient(self):
+        """Рецепт находится по названию ингредиента."""
+        self.assertIn('Борщ', self.search('свёкла'))
+        self.assertEqual(self.search('ягоды'), ['Компот'])
+
+    def test_vectors_updated_once_per_transaction(self):
+        """Поисковые векторы пересчитываются одним вызовом на коммит."""
+        recipe = self.recipes['Компот']
+        with mock.patch.object(
+            pending_search_vectors, 'handler'
+        ) as handler, self.captureOnCommitCallbacks(execute=True):
+            for name in ('вишня', 'яблоко'):
+                RecipeIngredient.objects.create(
+                    recipe=recipe, amount=1,
+                    ingredient=Ingredient.objects.create(
+                        name=name, measurement_unit='г'
+                    ),
+                )
+        handler.assert_called_once()
+        self.assertIn(recipe.id, handler.call_args.args[0])
+
+    def test_search_cursor_keeps_rank(self):
+        """Курсорная пагинация поиска сохраняет порядок по релевантности."""
+        names = []
+        url = '/api/recipes/?' + urlencode(
+            {'search': 'борщ', 'cursor': '', 'limit': 1}
+        )
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            names += [recipe['name'] for recipe in response.json()['results']]
+            url = response.json()['next']
+        self.assertEqual(names, ['Борщ', 'Салат'])
+
+
+class RecipeMatchTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass',
+            first_name='Автор', last_name='Авторов',
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(4)
+        ]
+        for name, ingredients in (
+            ('Полный', cls.ingredients[:2]),
+            ('Половина', cls.ingredients[1:3]),
+            ('Четверть', cls.ingredients),
+            ('Мимо', cls.ingredients[3:]),
+        ):
+            recipe = Recipe.objects.create(
+                author=author, name=name, text='Текст', cooking_time=10
+            )
+            for ingredient in ingredients:
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=1
+                )
+
+    def setUp(self):
+        recipe_matcher.invalidate()
+
+    def match(self, ingredients):
+        response = self.client.get(
+            f'/api/recipes/match/?ingredients={ingredients}'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [
+            (recipe['name'], recipe['coverage'])
+            for recipe in response.json()['results']
+        ]
+
+    def test_ranked_by_coverage(self):
+        """Рецепты упорядочены по доле имеющихся ингредиентов."""
+        ids = ','.join(str(ingredient.id)
+                       for ingredient in self.ingredients[:2])
+        self.assertEqual(self.match(ids), [
+            ('Полный', 1.0), ('Четверть', 0.5), ('Половина', 0.5),
+        ])
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется после изменения ингредиентов рецепта."""
+        ids = str(self.ingredients[3].id)
+        self.assertEqual(self.match(ids), [('Мимо', 1.0), ('Четверть', 0.25)])
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeIngredient.objects.filter(
+                recipe__name='Мимо'
+            ).first().delete()
+        self.assertEqual(self.match(ids), [('Четверть', 0.25)])
+
+    def test_index_updated_once_per_transaction(self):
+        """Индекс обновляется одним вызовом на коммит."""
+        recipe = Recipe.objects.get(name='Четверть')
+        with mock.patch.object(
+            pending_matcher_updates, 'handler'
+        ) as handler, self.captureOnCommitCallbacks(execute=True):
+            recipe.recipe_ingredients.all().delete()
+        handler.assert_called_once()
+        self.assertIn(recipe.id, handler.call_args.args[0])
+
+    def test_update_keeps_read_snapshot(self):
+        """Обновление индекса не меняет словари, уже взятые на чтение."""
+        recipe_matcher.match([self.ingredients[3].id])
+        postings, recipes = recipe_matcher.postings, recipe_matcher.recipes
+        snapshot = dict(recipes)
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeIngredient.objects.filter(
+                recipe__name='Мимо'
+            ).first().delete()
+        self.assertEqual(recipes, snapshot)
+        self.assertIsNot(recipe_matcher.recipes, recipes)
+        self.assertIsNot(recipe_matcher.postings, postings)
+
+    def test_invalid_ingredients(self):
+        """Некорректный список ингредиентов отклоняется."""
+        for ingredients in ('a,b', '²', '', '1,,2', '-1'):
+            response = self.client.get(
+                f'/api/recipes/match/?ingredients={ingredients}'
+            )
+            self.assertEqual(
+                response.status_code, HTTPStatus.BAD_REQUEST, ingredients
+            )
+
+
+class TokenAuthenticationCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass',
+            first_name='Читатель', last_name='Читателев',
+        )
+
+    def setUp(self):
+        cache.clear()
+        token_users.clear()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cached_user_skips_queries(self):
+        """Повторный запрос с токеном не проверяет токен в БД."""
+        self.assertEqual(
+            self.client.get('/api/users/me/').status_code, HTTPStatus.OK
+        )
+        # Остаётся только чтение профиля.
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/users/me/')
+        self.assertEqual(response.json()['email'], self.user.email)
+
+    def test_cache_keeps_no_password_hash(self):
+        """В кеше нет хеша пароля и полей профиля."""
+        self.client.get('/api/users/me/')
+        cached = cache.get(token_cache_key(self.token.key))
+        self.assertEqual(cached[:2], (self.user.pk, True))
+        self.assertNotIn(self.user.password, repr(cached))
+        self.assertNotIn(self.user.email, repr(cached))
+
+    def test_write_uses_fresh_user(self):
+        """Изменяющий запрос работает с актуальной строкой пользователя."""
+        self.client.get('/api/users/me/')
+        User.objects.filter(pk=self.user.pk).update(first_name='Новое')
+        response = self.client.patch(
+            '/api/users/me/', {'last_name': 'Другой'}, format='json'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.user.refresh_from_db()
+        self.assertEqual(
+            (self.user.first_name, self.user.last_name), ('Новое', 'Другой')
+        )
+
+    def test_write_rejects_deactivated_user(self):
+        """Деактивация через update() ловится первым изменяющим запросом."""
+        self.client.get('/api/users/me/')
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+        self.assertIsNone(cache.get(token_cache_key(self.token.key)))
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    def test_logout_invalidates_token(self):
+        """После выхода закешированный токен перестаёт работать."""
+        self.client.get('/api/users/me/')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    def test_cache_cleared_after_commit(self):
+        """Снимок токена сбрасывается только после коммита удаления."""
+        self.client.get('/api/users/me/')
+        key = token_cache_key(self.token.key)
+        with self.captureOnCommitCallbacks(execute=True):
+            Token.objects.filter(key=self.token.key).delete()
+            self.assertIsNotNone(cache.get(key))
+        self.assertIsNone(cache.get(key))
+        self.assertIsNone(token_users.get(self.token.key))
+
+    def test_user_changes_invalidate_cache(self):
+        """Смена пароля и деактивация сбрасывают снимок пользователя."""
+        self.client.get('/api/users/me/')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/users/set_password/', {
+                'current_password': 'pass', 'new_password': 'Tq3v-new-pass',
+            })
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.assertTrue(token_users.get(self.token.key) is None)
+        self.client.get('/api/users/me/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+
+class AnonymousPageCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {i}', color='#FF0000', slug=f'tag{i}'
+            )
+            for i in range(2)
+        ]
+        cls.recipes = []
+        for i, tag in enumerate(cls.tags):
+            author = User.objects.create_user(
+                username=f'author{i}', email=f'author{i}@example.com',
+                password='pass', first_name='Автор', last_name=str(i),
+            )
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {i}', text='Текст',
+                cooking_time=10,
+            )
+            RecipeTag.objects.create(recipe=recipe, tag=tag)
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def assertCached(self, url):
+        with self.assertNumQueries(0):
+            return self.client.get(url)
+
+    def test_anonymous_pages_cached(self):
+        """Повторный анонимный запрос не обращается к БД."""
+        recipe = self.recipes[0]
+        for url in ('/api/recipes/?tags=tag0&page=1',
+                    f'/api/recipes/{recipe.id}/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            self.assertEqual(self.assertCached(url).json(), response.json())
+        self.assertCached('/api/recipes/?page=1&tags=tag0&tags=tag0')
+
+    def test_authenticated_requests_not_cached(self):
+        """Ответы авторизованным пользователям не берутся из кеша."""
+        user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass',
+        )
+        self.client.get('/api/recipes/')
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/api/recipes/')
+        self.assertTrue(context.captured_queries)
+
+    def test_recipe_change_invalidates_affected_pages(self):
+        """Изменение рецепта сбрасывает только страницы с ним."""
+        first, second = self.recipes
+        for url in ('/api/recipes/', '/api/recipes/?tags=tag0',
+                    '/api/recipes/?tags=tag1', f'/api/recipes/{first.id}/'):
+            self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            second.name = 'Новое название'
+            second.save()
+        self.assertCached('/api/recipes/?tags=tag0')
+        self.assertCached(f'/api/recipes/{first.id}/')
+        response = self.client.get('/api/recipes/?tags=tag1')
+        self.assertEqual(
+            response.json()['results'][0]['name'], 'Новое название'
+        )
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(
+            response.json()['results'][0]['name'], 'Новое название'
+        )
+
+    def test_tag_change_invalidates_filtered_pages(self):
+        """Новый тег рецепта сбрасывает страницы с фильтром по этому тегу."""
+        first, second = self.recipes
+        self.client.get('/api/recipes/?tags=tag1')
+        self.client.get('/api/recipes/?author=' + str(second.author_id))
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeTag.objects.create(recipe=first, tag=self.tags[1])
+        response = self.client.get('/api/recipes/?tags=tag1')
+        self.assertEqual(response.json()['count'], 2)
+        self.assertCached('/api/recipes/?author=' + str(second.author_id))
+
+    def test_new_recipe_invalidates_feed(self):
+        """Новый рецепт появляется в общей ленте и ленте автора."""
+        first, _ = self.recipes
+        author_url = f'/api/recipes/?author={first.author_id}'
+        self.client.get('/api/recipes/')
+        self.client.get(author_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.create(
+                author=first.author, name='Ещё рецепт', text='Текст',
+                cooking_time=5,
+            )
+        self.assertEqual(self.client.get('/api/recipes/').json()['count'], 3)
+        self.assertEqual(self.client.get(author_url).json()['count'], 2)
+
+
+class RecipeDocumentTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass',
+        )
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass',
+            first_name='Автор', last_name='Авторов',
+        )
+        cls.tag = Tag.objects.create(
+            name='Завтрак', color='#FF0000', slug='breakfast'
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Блины', text='Текст', cooking_time=10,
+        )
+        RecipeTag.objects.create(recipe=cls.recipe, tag=cls.tag)
+        RecipeIngredient.objects.create(
+            recipe=cls.recipe, ingredient=cls.ingredient, amount=200
+        )
+        Subscription.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        self.url = f'/api/recipes/{self.recipe.id}/'
+
+    def test_document_matches_serializer(self):
+        """Ответ из документа совпадает с ответом сериализатора."""
+        request = APIRequestFactory().get(self.url)
+        request.user = self.reader
+        recipe = Recipe.objects.select_related('author').with_related().get(
+            pk=self.recipe.pk
+        )
+        expected = RecipeSerializer(recipe, context={'request': request}).data
+        response = self.client.get(self.url)
+        self.assertEqual(response.json(), json.loads(json.dumps(expected)))
+        self.assertTrue(response.json()['author']['is_subscribed'])
+        self.assertTrue(RecipeDocument.objects.filter(
+            recipe=self.recipe
+        ).exists())
+
+    def test_related_changes_rebuild_document(self):
+        """Изменение тега, ингредиента и автора пересобирает документ."""
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tag.name = 'Обед'
+            self.tag.save()
+            self.ingredient.name = 'Мука пшеничная'
+            self.ingredient.save()
+            self.author.first_name = 'Повар'
+            self.author.save()
+            recipe_ingredient = self.recipe.recipe_ingredients.get()
+            recipe_ingredient.amount = 300
+            recipe_ingredient.save()
+        data = self.client.get(self.url).json()
+        self.assertEqual(data['tags'][0]['name'], 'Обед')
+        self.assertEqual(data['ingredients'][0]['name'], 'Мука пшеничная')
+        self.assertEqual(data['ingredients'][0]['amount'], 300)
+        self.assertEqual(data['author']['first_name'], 'Повар')
+
+    def test_recipe_update_rebuilds_document(self):
+        """Редактирование рецепта через API обновляет документ."""
+        self.client.force_authenticate(self.author)
+        self.client.get(self.url)
+        tag = Tag.objects.create(name='Ужин', color='#00FF00', slug='dinner')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(self.url, {
+                'name': 'Блины',
+                'text': 'Текст',
+                'cooking_time': 10,
+                'tags': [tag.id],
+                'ingredients': [{'id': self.ingredient.id, 'amount': 50}],
+            }, format='json')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        data = self.client.get(self.url).json()
+        self.assertEqual([tag['slug'] for tag in data['tags']], ['dinner'])
+        self.assertEqual(data['ingredients'][0]['amount'], 50)
+
+    def test_migration_backfills_documents(self):
+        """Миграция заполняет документы в той же форме, что и API."""
+        expected = build_document(Recipe.objects.select_related(
+            'author'
+        ).with_related().get(pk=self.recipe.pk))
+        RecipeDocument.objects.all().delete()
+        import_module(
+            'recipes.migrations.0014_recipedocument'
+        ).fill_documents(django_apps, None)
+        self.assertEqual(
+            json.loads(RecipeDocument.objects.get(recipe=self.recipe).data),
+            json.loads(expected),
+        )
+
+    def test_concurrent_rebuild(self):
+        """Документ, вставленный параллельно, не ломает пересборку."""
+        rebuild_recipe_documents([self.recipe.pk])
+        # Удаление «опоздало»: строка уже есть к моменту вставки.
+        with mock.patch.object(QuerySet, 'delete', return_value=(0, {})):
+            rebuild_recipe_documents([self.recipe.pk])
+        self.assertEqual(
+            RecipeDocument.objects.filter(recipe=self.recipe).count(), 1
+        )
+
+    def test_rebuild_reads_after_lock(self):
+        """Рецепт читается для документа только после блокировки строки."""
+        # SQLite не знает FOR UPDATE: вместо суффикса ставим комментарий.
+        with mock.patch.object(
+            connection.features, 'has_select_for_update', True
+        ), mock.patch.object(
+            connection.ops, 'for_update_sql', return_value='/* FOR UPDATE */'
+        ), CaptureQueriesContext(connection) as context:
+            rebuild_recipe_documents([self.recipe.pk])
+        selects = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('SELECT')
+        ]
+        self.assertIn('FOR UPDATE', selects[0])
+        self.assertFalse(any('FOR UPDATE' in sql for sql in selects[1:]))
+
+
+class AsyncReadTestCase(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass',
+            first_name='Автор', last_name='Авторов',
+        )
+        tag = Tag.objects.create(name='Обед', color='#00FF00', slug='lunch')
+        self.recipe = Recipe.objects.create(
+            author=author, name='Суп', text='Текст', cooking_time=10
+        )
+        RecipeTag.objects.create(recipe=self.recipe, tag=tag)
+
+    def test_async_reads_match_sync(self):
+        """Асинхронные чтения отдают то же, что и синхронные view."""
+        factory = APIRequestFactory()
+        for viewset, actions, kwargs in (
+            (RecipeViewSet, {'get': 'list'}, {}),
+            (RecipeViewSet, {'get': 'retrieve'}, {'pk': self.recipe.pk}),
+            (TagViewSet, {'get': 'list'}, {}),
+        ):
+            sync_response = viewset.as_view(actions)(
+                factory.get('/'), **kwargs
+            )
+            sync_response.render()
+            async_response = async_to_sync(
+                async_read_view(viewset, actions)
+            )(factory.get('/'), **kwargs)
+            self.assertEqual(async_response.status_code, HTTPStatus.OK)
+            self.assertEqual(
+                json.loads(async_response.content),
+                json.loads(sync_response.content),
+            )
+
+
+TEMP_INSTRUMENTATION_DIR = tempfile.mkdtemp()
+
+
+@override_settings(
+    INSTRUMENTATION=True, INSTRUMENTATION_FLUSH_INTERVAL=0,
+    INSTRUMENTATION_DIR=TEMP_INSTRUMENTATION_DIR,
+)
+class InstrumentationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Tag.objects.create(name='Завтрак', color='#FF0000', slug='breakfast')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_INSTRUMENTATION_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        call_command('instrumentation', reset=True, stdout=StringIO())
+
+    def test_server_timing_and_report(self):
+        """Middleware добавляет Server-Timing и пишет статистику по view."""
+        response = APIClient().get('/api/tags/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('total;dur=', response['Server-Timing'])
+        out = StringIO()
+        call_command('instrumentation', stdout=out)
+        self.assertIn('GET api:tags-list', out.getvalue())
+
+
+class BenchmarkCommandTestCase(TestCase):
+
+    def test_benchmark_rolls_back(self):
+        """Бенчмарк выводит отчёт и не оставляет данных в базе."""
+        out = StringIO()
+        call_command(
+            'benchmark', users=3, recipes=5, iterations=2, stdout=out
+        )
+        for name in ('recipe-list', 'recipe-create', 'ingredient-search'):
+            self.assertIn(name, out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(User.objects.exists())
+
+    def test_renderer_comparison(self):
+        """Сравнение рендереров выдаёт одинаковый JSON."""
+        out = StringIO()
+        call_command(
+            'benchmark', users=3, recipes=5, iterations=2, renderers=True,
+            only=['recipe-list'], stdout=out,
+        )
+        rows = [
+            line.split() for line in out.getvalue().splitlines()
+            if line.startswith(('ingredient-list', 'recipe-page'))
+        ]
+        self.assertEqual(len(rows), 4)
+        self.assertTrue(all(row[-1] == 'yes' for row in rows))
+
+
+class FastJSONTestCase(TestCase):
+
+    def test_renderer_matches_drf(self):
+        """Быстрый рендерер выдаёт тот же JSON, что и стандартный."""
+        data = {
+            'name': 'Мука\u2028пшеничная',
+            'amount': Decimal('1.50'),
+            'created': datetime(2023, 1, 2, 3, 4, 5, 678000,
+                                tzinfo=timezone.utc),
+            'day': date(2023, 1, 2),
+            'detail': gettext_lazy('Not found.'),
+            'ids': {1: 'один'},
+            'items': [None, True, 1.5],
+        }
+        self.assertEqual(
+            FastJSONRenderer().render(data), JSONRenderer().render(data)
+        )
+        self.assertEqual(
+            FastJSONRenderer().render(
+                data, 'application/json; indent=4'
+            ),
+            JSONRenderer().render(data, 'application/json; indent=4'),
+        )
+
+    def test_api_response(self):
+        """Ответы API отдаются без экранирования кириллицы."""
+        Ingredient.objects.create(name='Мука', measurement_unit='г')
+        response = self.client.get('/api/ingredients/')
+        self.assertIn('Мука'.encode(), response.content)
+        self.assertEqual(response.json()[0]['name'], 'Мука')
+
+    def test_parser(self):
+        """Быстрый парсер разбирает JSON и сообщает об ошибках."""
+        parser = FastJSONParser()
+        self.assertEqual(
+            parser.parse(BytesIO('{"name": "Мука"}'.encode())),
+            {'name': 'Мука'},
+        )
+        with self.assertRaises(ParseError):
+            parser.parse(BytesIO(b'{"name": '))
+
+
+QUERY_BASELINE = Path(__file__).resolve().parent / 'query_baseline.json'
+DATASET_SIZES = (2, 6)
+# Удаление пользователя каскадом удаляет его рецепты, и сигналы
+# срабатывают на каждую строку: число запросов растёт с объёмом данных.
+SCALING_ROUTES = {'DELETE users-detail', 'DELETE users-me'}
+TEMP_QUERY_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def recipe_payload(dataset):
+    return {
+        'ingredients': [
+            {'id': ingredient.id, 'amount': 5}
+            for ingredient in dataset.ingredients
+        ],
+        'tags': [tag.id for tag in dataset.tags],
+        'image': SMALL_GIF,
+        'name': 'Новый рецепт',
+        'text': 'Описание',
+        'cooking_time': 30,
+    }
+
+
+def user_payload(dataset):
+    return {
+        'email': 'new@example.com', 'username': 'new',
+        'first_name': 'Новый', 'last_name': 'Пользователь',
+        'password': 'Tq3v-new-pass',
+    }
+
+
+QUERY_ROUTES = {
+    'GET api-root': lambda d: (reverse('api:api-root'), None),
+    'POST login': lambda d: (
+        reverse('api:login'),
+        {'email': d.reader.email, 'password': 'pass'},
+    ),
+    'POST logout': lambda d: (reverse('api:logout'), None),
+    'GET ingredients-list': lambda d: (
+        reverse('api:ingredients-list') + '?name=Ингр', None
+    ),
+    'GET ingredients-detail': lambda d: (
+        reverse('api:ingredients-detail', args=(d.ingredients[0].id, )),
+        None,
+    ),
+    'GET tags-list': lambda d: (reverse('api:tags-list'), None),
+    'GET tags-detail': lambda d: (
+        reverse('api:tags-detail', args=(d.tags[0].id, )), None
+    ),
+    'GET recipes-list': lambda d: (reverse('api:recipes-list'), None),
+    'POST recipes-list': lambda d: (
+        reverse('api:recipes-list'), recipe_payload(d)
+    ),
+    'GET recipes-detail': lambda d: (
+        reverse('api:recipes-detail', args=(d.recipe.id, )), None
+    ),
+    'PUT recipes-detail': lambda d: (
+        reverse('api:recipes-detail', args=(d.recipe.id, )),
+        recipe_payload(d),
+    ),
+    'PATCH recipes-detail': lambda d: (
+        reverse('api:recipes-detail', args=(d.recipe.id, )),
+        recipe_payload(d),
+    ),
+    'DELETE recipes-detail': lambda d: (
+        reverse('api:recipes-detail', args=(d.recipe.id, )), None
+    ),
+    'POST recipes-favorite': lambda d: (
+        reverse('api:recipes-favorite', args=(d.recipe.id, )), None
+    ),
+    'DELETE recipes-favorite': lambda d: (
+        reverse('api:recipes-favorite', args=(d.saved_recipe.id, )), None
+    ),
+    'POST recipes-shopping-cart': lambda d: (
+        reverse('api:recipes-shopping-cart', args=(d.recipe.id, )), None
+    ),
+    'DELETE recipes-shopping-cart': lambda d: (
+        reverse('api:recipes-shopping-cart', args=(d.saved_recipe.id, )),
+        None,
+    ),
+    'GET recipes-download-shopping-cart': lambda d: (
+        reverse('api:recipes-download-shopping-cart') + '?format=txt', None
+    ),
+    'GET recipes-shopping-list': lambda d: (
+        reverse('api:recipes-shopping-list'), None
+    ),
+    'GET recipes-match': lambda d: (
+        reverse('api:recipes-match') + '?ingredients=' + ','.join(
+            str(ingredient.id) for ingredient in d.ingredients
+        ),
+        None,
+    ),
+    'GET users-list': lambda d: (reverse('api:users-list'), None),
+    'POST users-list': lambda d: (reverse('api:users-list'), user_payload(d)),
+    'GET users-detail': lambda d: (
+        reverse('api:users-detail', args=(d.author.id, )), None
+    ),
+    'PUT users-detail': lambda d: (
+        reverse('api:users-detail', args=(d.reader.id, )), user_payload(d)
+    ),
+    'PATCH users-detail': lambda d: (
+        reverse('api:users-detail', args=(d.reader.id, )),
+        {'first_name': 'Читатель'},
+    ),
+    'DELETE users-detail': lambda d: (
+        reverse('api:users-detail', args=(d.reader.id, )),
+        {'current_password': 'pass'},
+    ),
+    'GET users-me': lambda d: (reverse('api:users-me'), None),
+    'PUT users-me': lambda d: (reverse('api:users-me'), user_payload(d)),
+    'PATCH users-me': lambda d: (
+        reverse('api:users-me'), {'first_name': 'Читатель'}
+    ),
+    'DELETE users-me': lambda d: (
+        reverse('api:users-me'), {'current_password': 'pass'}
+    ),
+    'GET users-get-subscriptions': lambda d: (
+        reverse('api:users-get-subscriptions') + '?recipes_limit=3', None
+    ),
+    'POST users-subscribe': lambda d: (
+        reverse('api:users-subscribe', args=(d.stranger.id, )), None
+    ),
+    'DELETE users-subscribe': lambda d: (
+        reverse('api:users-subscribe', args=(d.author.id, )), None
+    ),
+    'POST users-set-password': lambda d: (
+        reverse('api:users-set-password'),
+        {'current_password': 'pass', 'new_password': 'Tq3v-new-pass'},
+    ),
+    'POST users-set-username': lambda d: (
+        reverse('api:users-set-username'),
+        {'current_password': 'pass', 'new_email': 'new@example.com'},
+    ),
+    'POST users-activation': lambda d: (
+        reverse('api:users-activation'), {'uid': 'MQ', 'token': 'token'}
+    ),
+    'POST users-resend-activation': lambda d: (
+        reverse('api:users-resend-activation'), {'email': d.reader.email}
+    ),
+    'POST users-reset-password': lambda d: (
+        reverse('api:users-reset-password'), {'email': 'missing@example.com'}
+    ),
+    'POST users-reset-password-confirm': lambda d: (
+        reverse('api:users-reset-password-confirm'),
+        {'uid': 'MQ', 'token': 'token', 'new_password': 'Tq3v-new-pass'},
+    ),
+    'POST users-reset-username': lambda d: (
+        reverse('api:users-reset-username'), {'email': 'missing@example.com'}
+    ),
+    'POST users-reset-username-confirm': lambda d: (
+        reverse('api:users-reset-username-confirm'),
+        {'uid': 'MQ', 'token': 'token', 'new_email': 'new@example.com'},
+    ),
+}
+
+
+def api_routes():
+    routes = set()
+    patterns = set()
+    for pattern in get_resolver().url_patterns:
+        if getattr(pattern, 'namespace', None) == 'api':
+            break
+    stack = list(pattern.url_patterns)
+    while stack:
+        pattern = stack.pop(0)
+        if hasattr(pattern, 'url_patterns'):
+            stack[:0] = pattern.url_patterns
+            continue
+        regex = pattern.pattern.regex.pattern
+        if '(?P<format>' in regex or regex in patterns:
+            continue
+        patterns.add(regex)
+        actions = getattr(pattern.callback, 'actions', None)
+        if actions is None:
+            view = pattern.callback.cls
+            actions = [
+                method for method in ('get', 'post', 'put', 'patch', 'delete')
+                if hasattr(view, method)
+            ]
+        routes |= {
+            f'{method.upper()} {pattern.name}'
+            for method in actions if method != 'head'
+        }
+    return routes
+
+
+class QueryDataset:
+
+    def __init__(self, size):
+        self.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass',
+            first_name='Читатель', last_name='Читателев',
+        )
+        self.stranger = User.objects.create_user(
+            username='stranger', email='stranger@example.com',
+            password='pass', first_name='Незнакомец', last_name='Чужой',
+        )
+        self.tags = [
+            Tag.objects.create(
+                name=f'Тег {i}', color='#FF0000', slug=f'tag{i}'
+            )
+            for i in range(size)
+        ]
+        self.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г'
+            )
+            for i in range(size)
+        ]
+        self.authors = [
+            User.objects.create_user(
+                username=f'author{i}', email=f'author{i}@example.com',
+                password='pass', first_name='Автор', last_name=str(i),
+            )
+            for i in range(size)
+        ]
+        self.author = self.authors[0]
+        recipes = []
+        for author in (self.reader, *self.authors):
+            for i in range(size):
+                recipe = Recipe.objects.create(
+                    author=author, name=f'Рецепт {i}', text='Текст',
+                    cooking_time=10,
+                )
+                for tag in self.tags:
+                    RecipeTag.objects.create(recipe=recipe, tag=tag)
+                for ingredient in self.ingredients:
+                    RecipeIngredient.objects.create(
+                        recipe=recipe, ingredient=ingredient, amount=i + 1
+                    )
+                recipes.append(recipe)
+        self.recipe = recipes[0]
+        self.saved_recipe = recipes[-1]
+        for author in self.authors:
+            Subscription.objects.create(user=self.reader, author=author)
+        for recipe in recipes[size:]:
+            Favorite.objects.create(user=self.reader, recipe=recipe)
+            ShoppingCart.objects.create(user=self.reader, recipe=recipe)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_QUERY_MEDIA_ROOT,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class QueryCountRegressionTestCase(TestCase):
+    """Число запросов к БД по всем маршрутам API сверяется с базовым.
+
+    GET замеряется дважды: с пустыми кешами (cold) и после прогрева.
+    Кроме того, число запросов не должно зависеть от объёма данных,
+    если маршрут не внесён в SCALING_ROUTES.
+
+    Обновить базовый файл после осознанного изменения:
+    UPDATE_QUERY_BASELINE=1 python manage.py test
+    api.tests.QueryCountRegressionTestCase
+    """
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_QUERY_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def measure(self, dataset, route, warm=False):
+        method, _ = route.split(' ', 1)
+        url, data = QUERY_ROUTES[route](dataset)
+        client = APIClient()
+        if route != 'POST login':
+            # Запросы могут менять пользователя в памяти (DELETE обнуляет
+            # pk), поэтому каждый раз берём свежий объект из базы.
+            client.force_authenticate(
+                User.objects.get(email=dataset.reader.email)
+            )
+        request = getattr(client, method.lower())
+        cache.clear()
+        ingredient_index.invalidate()
+        recipe_matcher.invalidate()
+        with transaction.atomic():
+            if warm:
+                with self.captureOnCommitCallbacks(execute=True):
+                    request(url)
+            # Работа, отложенная до коммита, тоже входит в замер.
+            with CaptureQueriesContext(connection) as context:
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = request(url, data, format='json')
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            transaction.set_rollback(True)
+        self.assertLess(
+            response.status_code, HTTPStatus.INTERNAL_SERVER_ERROR, route
+        )
+        return len(context.captured_queries)
+
+    def test_routes_covered(self):
+        """Для каждого маршрута API задан запрос в наборе замеров."""
+        self.assertEqual(api_routes(), set(QUERY_ROUTES))
+
+    def test_query_counts(self):
+        """Число запросов к БД не превышает зафиксированное."""
+        measured = {}
+        for size in DATASET_SIZES:
+            with transaction.atomic():
+                with self.captureOnCommitCallbacks(execute=True):
+                    dataset = QueryDataset(size)
+                for route in sorted(QUERY_ROUTES):
+                    # GET замеряется и с пустыми кешами, и после прогрева.
+                    variants = (
+                        ((route, True), (f'{route} cold', False))
+                        if route.startswith('GET ') else ((route, False), )
+                    )
+                    for name, warm in variants:
+                        measured.setdefault(name, {})[str(size)] = (
+                            self.measure(dataset, route, warm)
+                        )
+                transaction.set_rollback(True)
+        scaling = [
+            f'{name}: ' + ' -> '.join(
+                str(counts[str(size)]) for size in DATASET_SIZES
+            )
+            for name, counts in sorted(measured.items())
+            if name not in SCALING_ROUTES and len(set(counts.values())) > 1
+        ]
+        self.assertFalse(
+            scaling,
+            'Число запросов зависит от объёма данных:\n' + '\n'.join(scaling),
+        )
+        baseline = (
+            json.loads(QUERY_BASELINE.read_text())
+            if QUERY_BASELINE.exists() else {}
+        )
+        if os.getenv('UPDATE_QUERY_BASELINE'):
+            baseline[connection.vendor] = measured
+            QUERY_BASELINE.write_text(
+                json.dumps(baseline, indent=2, sort_keys=True) + '\n'
+            )
+            return
+        if connection.vendor not in baseline:
+            self.skipTest(f'Нет базовых значений для {connection.vendor}')
+        expected = baseline[connection.vendor]
+        regressions = [
+            f'{route}: нет базового значения'
+            for route in sorted(set(measured) - set(expected))
+        ] + [
+            f'{route} (n={size}): {count} > {expected[route][size]}'
+            for route, counts in sorted(measured.items()) if route in expected
+            for size, count in counts.items()
+            if count > expected[route][size]
+        ]
+        self.assertFalse(
+            regressions,
+            'Число запросов к БД выросло:\n' + '\n'.join(regressions),
+        )
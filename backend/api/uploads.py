@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.MAX_UPLOAD_SIZE:
+            raise MultiPartParserError(
+                'Размер файла превышает '
+                f'{settings.MAX_UPLOAD_SIZE // (1024 * 1024)} МБ'
+            )
+        return super().receive_data_chunk(raw_data, start)
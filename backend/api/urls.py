@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from api.async_views import async_read_urls
 from api.views import (IngredientViewSet, RecipeViewSet,
                        UserViewSet, TagViewSet)
 
@@ -18,3 +20,6 @@ urlpatterns = [
     path('', include(router.urls)),
     path('', include('djoser.urls')),
 ]
+
+if settings.ASYNC_READS:
+    urlpatterns = async_read_urls() + urlpatterns
@@ -0,0 +1,63 @@
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscription
+
+USER_STATE_FIELDS = {
+    Favorite: ('favorites', 'recipe_id'),
+    ShoppingCart: ('shopping_cart', 'recipe_id'),
+    Subscription: ('subscriptions', 'author_id'),
+}
+
+
+def user_state_key(user_id, name):
+    return f'user_state:{user_id}:{name}'
+
+
+def invalidate_user_state(model, user_id):
+    # Удаление идёт через queryset, и сигнал приходит до коммита: сброс
+    # откладывается, чтобы параллельный запрос не закешировал старые id.
+    name, _ = USER_STATE_FIELDS[model]
+    key = user_state_key(user_id, name)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+class UserState:
+
+    def __init__(self, user):
+        self.user = user
+        self.loaded = {}
+
+    def ids(self, model):
+        name, field = USER_STATE_FIELDS[model]
+        if self.user.is_anonymous:
+            return frozenset()
+        if name not in self.loaded:
+            key = user_state_key(self.user.id, name)
+            ids = cache.get(key)
+            if ids is None:
+                ids = array('q', sorted(model.objects.filter(
+                    user=self.user
+                ).values_list(field, flat=True)))
+                cache.set(key, ids, settings.USER_STATE_TIMEOUT)
+            self.loaded[name] = frozenset(ids)
+        return self.loaded[name]
+
+    def is_favorited(self, recipe_id):
+        return recipe_id in self.ids(Favorite)
+
+    def is_in_shopping_cart(self, recipe_id):
+        return recipe_id in self.ids(ShoppingCart)
+
+    def is_subscribed(self, author_id):
+        return author_id in self.ids(Subscription)
+
+
+def get_user_state(request):
+    if not hasattr(request, 'user_state'):
+        request.user_state = UserState(request.user)
+    return request.user_state
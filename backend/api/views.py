@@ -1,5 +1,4 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
@@ -8,50 +7,112 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from djoser.views import UserViewSet
 
-from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.matching import recipe_matcher
+from recipes.search import ingredient_index
 from users.models import User, Subscription
-from api.filters import IngredientFilter, RecipeFilter
-from api.pagination import CustomPagination
+from api.cache import ReferenceCacheMixin
+from api.documents import RecipeDocumentSerializer, schedule_document_update
+from api.filters import RecipeFilter
+from api.negotiation import IgnoreFormatContentNegotiation
+from api.page_cache import AnonymousPageCacheMixin
+from api.pagination import CustomPagination, PageNumberOnlyPagination
+from api.parsers import FastJSONParser, MultiPartJSONParser
 from api.permissions import IsAuthorOrReadOnly
 from api.serializers import (CreateRecipeSerializer, FavoriteSerializer,
-                             IngredientSerializer, RecipeSerializer,
-                             ShoppingCartSerializer, TagSerializer,
-                             SubscriptionSerializer)
+                             IngredientSerializer, RecipeMatchSerializer,
+                             ShoppingCartSerializer,
+                             ShoppingListItemSerializer,
+                             ShowSubscriptionsSerializer,
+                             SubscriptionSerializer, TagSerializer,
+                             get_recipes_limit)
+from api.shopping_list import DEFAULT_FORMAT, SHOPPING_LIST_FORMATS
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ReferenceCacheMixin,
+                        viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     permission_classes = (AllowAny, )
     serializer_class = IngredientSerializer
     paginator = None
-    filter_backends = (IngredientFilter, )
-    search_fields = ('^name', )
 
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(self.search, request)
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+    def search(self, request):
+        ingredients = ingredient_index.search(
+            request.query_params.get('name', '')
+        )
+        serializer = self.get_serializer(ingredients, many=True)
+        return Response(serializer.data)
+
+
+class TagViewSet(ReferenceCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     permission_classes = (AllowAny, )
     serializer_class = TagSerializer
     paginator = None
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousPageCacheMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly, )
     pagination_class = CustomPagination
+    parser_classes = (FastJSONParser, MultiPartJSONParser)
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        queryset = Recipe.objects.defer('search_vector')
+        if self.action in ('list', 'retrieve'):
+            return queryset.select_related('document')
+        return queryset.select_related('author').with_related()
+
     def get_serializer_class(self):
         if self.request.method == 'GET':
-            return RecipeSerializer
+            return RecipeDocumentSerializer
         return CreateRecipeSerializer
 
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        schedule_document_update((serializer.instance.id, ))
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context.update({'request': self.request})
         return context
 
+    @action(detail=False, pagination_class=PageNumberOnlyPagination)
+    def match(self, request):
+        try:
+            ingredient_ids = [
+                int(value)
+                for values in request.query_params.getlist('ingredients')
+                for value in values.split(',')
+            ]
+        except ValueError:
+            ingredient_ids = None
+        if not ingredient_ids or min(ingredient_ids) < 0:
+            return Response(
+                {'ingredients': 'Укажите id ингредиентов через запятую'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        matches = recipe_matcher.match(ingredient_ids)
+        page = self.paginate_queryset(matches)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in page]
+        )
+        matched = []
+        for recipe_id, coverage in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                recipe.coverage = coverage
+                matched.append(recipe)
+        serializer = RecipeMatchSerializer(
+            matched, many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=('post', ),
             permission_classes=(IsAuthenticated, ))
     def shopping_cart(self, request, pk):
@@ -73,30 +134,37 @@ class RecipeViewSet(viewsets.ModelViewSet):
         favorites = get_object_or_404(Recipe, id=pk).favorites
         return delete_record_model(favorites, request, pk)
 
-    @action(detail=False)
+    @action(detail=False, permission_classes=(IsAuthenticated, ))
+    def shopping_list(self, request):
+        return Response(ShoppingListItemSerializer(
+            request.user.shopping_list.all(), many=True
+        ).data)
+
+    @action(detail=False,
+            permission_classes=(IsAuthenticated, ),
+            content_negotiation_class=IgnoreFormatContentNegotiation)
     def download_shopping_cart(self, request):
-        ingredient_list = "Cписок покупок:"
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shopping_cart__user=request.user
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-        for num, ing in enumerate(ingredients):
-            ingredient_list += (
-                f"\n{ing['ingredient__name']} - "
-                f"{ing['amount']} {ing['ingredient__measurement_unit']}"
+        file_format = request.query_params.get('format', DEFAULT_FORMAT)
+        if file_format not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'format': 'Допустимые форматы: '
+                           f'{", ".join(SHOPPING_LIST_FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            if num < ingredients.count() - 1:
-                ingredient_list += ', '
-        file = 'shopping_list'
-        response = HttpResponse(
-            ingredient_list, 'Content-Type: application/pdf'
+        render, content_type = SHOPPING_LIST_FORMATS[file_format]
+        items = request.user.shopping_list.values(
+            'name', 'measurement_unit', 'amount'
+        )
+        response = StreamingHttpResponse(
+            render(items.iterator()), content_type=content_type
         )
-        response['Content-Disposition'] = f'attachment; filename="{file}.pdf"'
+        file = f'shopping_list.{file_format}'
+        response['Content-Disposition'] = f'attachment; filename="{file}"'
         return response
 
 
 class UserViewSet(UserViewSet):
+    cursor_ordering = ('-id', )
 
     def get_permissions(self):
         if self.action == 'retrieve':
@@ -105,14 +173,30 @@ class UserViewSet(UserViewSet):
         else:
             return super().get_permissions()
 
+    def get_instance(self):
+        # Аутентификация по кешу отдаёт пользователя только с pk, а для
+        # профиля он нужен целиком: читаем его одним запросом.
+        if self.request.user.get_deferred_fields():
+            self.request.user = User.objects.get(pk=self.request.user.pk)
+        return super().get_instance()
+
     @action(detail=False,
             url_path='subscriptions',
             permission_classes=(IsAuthenticated, ))
     def get_subscriptions(self, request):
-        queryset = Subscription.objects.filter(user=request.user)
+        limit = get_recipes_limit(request)
+        queryset = Subscription.objects.filter(
+            user=request.user
+        ).select_related('author').order_by('-id')
         page = self.paginate_queryset(queryset)
-        serializer = SubscriptionSerializer(
-            page, many=True, context={'request': request}
+        authors = {subscription.author_id: subscription.author
+                   for subscription in page}
+        for author in authors.values():
+            author.recipe_previews = []
+        for recipe in Recipe.objects.latest_by_author(list(authors), limit):
+            authors[recipe.author_id].recipe_previews.append(recipe)
+        serializer = ShowSubscriptionsSerializer(
+            authors.values(), many=True, context={'request': request}
         )
         return self.get_paginated_response(serializer.data)
 
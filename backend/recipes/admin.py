@@ -25,14 +25,12 @@ class TagAdmin(admin.ModelAdmin):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'author', 'count_favorites')
+    list_display = ('id', 'name', 'author', 'favorites_count')
     search_fields = ('name', 'author__username')
     list_filter = ('tags', )
     empty_value_display = EMPTY_MESSAGE
     inlines = (IngredientsInLine, )
-
-    def count_favorites(self, obj):
-        return obj.favorites.count()
+    list_select_related = ('author', )
 
 
 @admin.register(ShoppingCart)
@@ -0,0 +1,47 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+
+class CounterFieldsMixin:
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        # Счётчики меняются только через change_counter и recount: полное
+        # сохранение объекта, загруженного раньше, не должно их затирать.
+        if (
+            not args and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert') and not self._state.adding
+        ):
+            skipped = {*self.counter_fields, *self.get_deferred_fields()}
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+                and field.name not in skipped
+            ]
+        super().save(*args, **kwargs)
+
+
+def count_subquery(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), Value(0))
+
+
+def recount(recipe_model, user_model, favorite_model, subscription_model):
+    recipe_model.objects.update(
+        favorites_count=count_subquery(favorite_model, 'recipe')
+    )
+    user_model.objects.update(
+        recipes_count=count_subquery(recipe_model, 'author'),
+        subscribers_count=count_subquery(subscription_model, 'author'),
+    )
+
+
+def change_counter(model, pk, field, delta):
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, Value(0))}
+    )
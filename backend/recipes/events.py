@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+# update() и bulk_create() не вызывают сигналы моделей, поэтому о
+# массовых изменениях сообщают отдельно: кеши в api подписываются на них.
+references_loaded = Signal()
+recipe_images_ready = Signal()
+recounted = Signal()
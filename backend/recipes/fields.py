@@ -0,0 +1,9 @@
+from django.db import models
+
+
+class SearchVectorField(models.TextField):
+
+    def db_type(self, connection):
+        if connection.vendor == 'postgresql':
+            return 'tsvector'
+        return super().db_type(connection)
@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import (BooleanField, Case, FloatField, Q, Value,
+                              When)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import StrIndex
+
+from recipes.models import Recipe, RecipeIngredient
+from recipes.pending import PendingIds
+
+SECTION_SEPARATOR = '\n'
+POSTGRES_VECTOR = '''
+    setweight(to_tsvector(%(config)s, recipe.name), 'A')
+    || setweight(to_tsvector(%(config)s, coalesce((
+        SELECT string_agg(ingredient.name, ' ')
+        FROM recipes_recipeingredient AS recipe_ingredient
+        JOIN recipes_ingredient AS ingredient
+            ON ingredient.id = recipe_ingredient.ingredient_id
+        WHERE recipe_ingredient.recipe_id = recipe.id
+    ), '')), 'B')
+    || setweight(to_tsvector(%(config)s, recipe.text), 'C')
+'''
+
+
+def update_search_vectors(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE recipes_recipe AS recipe '
+                f'SET search_vector = {POSTGRES_VECTOR} '
+                'WHERE recipe.id = ANY(%(ids)s)',
+                {'config': settings.SEARCH_CONFIG, 'ids': recipe_ids},
+            )
+        return
+    ingredients = {}
+    for recipe_id, name in RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'ingredient__name'):
+        ingredients.setdefault(recipe_id, []).append(name)
+    recipes = Recipe.objects.filter(pk__in=recipe_ids).only('name', 'text')
+    for recipe in recipes:
+        recipe.search_vector = SECTION_SEPARATOR.join((
+            recipe.name,
+            ' '.join(ingredients.get(recipe.id, ())),
+            recipe.text,
+        )).lower()
+    Recipe.objects.bulk_update(recipes, ('search_vector', ))
+
+
+pending_search_vectors = PendingIds(update_search_vectors)
+
+
+def schedule_search_vector_update(recipe_ids):
+    pending_search_vectors.add(recipe_ids)
+
+
+def search_recipes(queryset, query):
+    query = query.strip()
+    if not query:
+        return queryset
+    if connection.vendor == 'postgresql':
+        vector = f'{Recipe._meta.db_table}.search_vector'
+        tsquery = 'plainto_tsquery(%s, %s)'
+        params = (settings.SEARCH_CONFIG, query)
+        return queryset.filter(RawSQL(
+            f'{vector} @@ {tsquery}', params, output_field=BooleanField()
+        )).annotate(search_rank=RawSQL(
+            f'ts_rank({vector}, {tsquery})', params,
+            output_field=FloatField(),
+        )).order_by('-search_rank', '-pub_date', '-id')
+    condition = Q()
+    rank = Value(0.0)
+    name_end = StrIndex('search_vector', Value(SECTION_SEPARATOR))
+    for word in query.lower().split():
+        condition &= Q(search_vector__contains=word)
+        rank += Case(
+            When(Q(search_rank_name_end__gt=StrIndex(
+                'search_vector', Value(word)
+            )), then=Value(1.0)),
+            default=Value(0.5),
+            output_field=FloatField(),
+        )
+    return queryset.filter(condition).annotate(
+        search_rank_name_end=name_end
+    ).annotate(search_rank=rank).order_by('-search_rank', '-pub_date', '-id')
@@ -0,0 +1,95 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from recipes.events import recipe_images_ready
+from recipes.models import Recipe
+
+VARIANTS_DIR = 'media/recipes/variants'
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS, thread_name_prefix='images'
+)
+
+
+def variant_name(image_name, variant):
+    stem = PurePosixPath(image_name).stem
+    return f'{VARIANTS_DIR}/{stem}_{variant}.webp'
+
+
+def render_variant(image, size):
+    variant = image.copy()
+    variant.thumbnail(size, Image.LANCZOS)
+    buffer = BytesIO()
+    variant.save(buffer, 'WEBP', quality=settings.IMAGE_WEBP_QUALITY)
+    return ContentFile(buffer.getvalue())
+
+
+def strip_metadata(image_name, image):
+    # Оригинал тоже отдаётся клиентам, поэтому EXIF (в том числе GPS)
+    # вычищается и из него; файл перезаписывается на том же месте.
+    if image.format not in ('JPEG', 'PNG', 'WEBP') or not (
+        image.getexif() or image.info.get('exif')
+    ):
+        return
+    buffer = BytesIO()
+    options = {'quality': 95} if image.format == 'JPEG' else {}
+    ImageOps.exif_transpose(image).save(buffer, image.format, **options)
+    with default_storage.open(image_name, 'wb') as file:
+        file.write(buffer.getvalue())
+
+
+def process_recipe_image(recipe_id, image_name):
+    close_old_connections()
+    try:
+        with default_storage.open(image_name) as file:
+            original = Image.open(file)
+            original.load()
+        image = ImageOps.exif_transpose(original).convert(
+            'RGBA' if 'A' in original.getbands() else 'RGB'
+        )
+        strip_metadata(image_name, original)
+        names = {}
+        for variant, size in settings.IMAGE_VARIANTS.items():
+            name = variant_name(image_name, variant)
+            default_storage.delete(name)
+            names[f'image_{variant}'] = default_storage.save(
+                name, render_variant(image, size)
+            )
+        previous = Recipe.objects.filter(pk=recipe_id).values(*names).first()
+        if Recipe.objects.filter(
+            pk=recipe_id, image=image_name
+        ).update(**names):
+            for field, name in (previous or {}).items():
+                if name and name != names[field]:
+                    default_storage.delete(name)
+            recipe_images_ready.send(sender=Recipe, recipe_id=recipe_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_recipe_image(recipe):
+    recipe_id, image_name = recipe.pk, recipe.image.name
+
+    def submit():
+        if settings.IMAGE_PROCESSING == 'sync':
+            process_recipe_image(recipe_id, image_name)
+        else:
+            executor.submit(process_recipe_image, recipe_id, image_name)
+
+    transaction.on_commit(submit)
+
+
+def needs_variants(recipe):
+    return bool(recipe.image) and any(
+        getattr(recipe, f'image_{variant}') != variant_name(
+            recipe.image.name, variant
+        )
+        for variant in settings.IMAGE_VARIANTS
+    )
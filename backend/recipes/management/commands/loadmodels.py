@@ -1,36 +1,136 @@
+import csv
 import json
+from itertools import islice
+from pathlib import Path
+from time import monotonic
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from recipes.events import references_loaded
 from recipes.models import Ingredient, Tag
 
+CHUNK_SIZE = 64 * 1024
+MODELS = {
+    'ingredient': (Ingredient, ('name', 'measurement_unit'),
+                   ('name', 'measurement_unit')),
+    'tag': (Tag, ('name', 'color', 'slug'), ('slug', )),
+}
+
+
+def iter_json(file):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,[]':
+            position += 1
+        if position == len(buffer) and eof:
+            return
+        try:
+            record, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise CommandError('Некорректный JSON в файле')
+            chunk = file.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield record
+
+
+def iter_csv(file, fields):
+    for row in csv.reader(file):
+        if row:
+            yield dict(zip(fields, row))
+
+
+def detect_model(record):
+    if 'color' in record:
+        return 'tag'
+    return 'ingredient'
+
 
 class Command(BaseCommand):
+    help = 'Загружает теги или ингредиенты из JSON или CSV файла'
 
     def add_arguments(self, parser):
         parser.add_argument("--path", type=str, help="file path")
+        parser.add_argument(
+            "--model", choices=MODELS,
+            help="model to load, detected from the file by default"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="rows per INSERT"
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="parse and count records without saving them"
+        )
 
     def handle(self, *args, **options):
-        file_path = options["path"]
-
+        file_path = Path(options["path"])
         with open(file_path, encoding='utf-8') as f:
+            if file_path.suffix == '.csv':
+                first = f.readline()
+                columns = len(next(csv.reader([first]), []))
+                name = options['model'] or (
+                    'tag' if columns == len(MODELS['tag'][1])
+                    else 'ingredient'
+                )
+                f.seek(0)
+                records = iter_csv(f, MODELS[name][1])
+            else:
+                records = iter_json(f)
+                first = next(records, None)
+                if first is None:
+                    return
+                name = options['model'] or detect_model(first)
+                records = self.chain(first, records)
+            self.load(MODELS[name], records, options)
+
+    @staticmethod
+    def chain(first, records):
+        yield first
+        yield from records
+
+    def unique_objects(self, model, fields, key, records):
+        seen = set()
+        for record in records:
+            unique = tuple(record[field] for field in key)
+            if unique in seen:
+                continue
+            seen.add(unique)
+            yield model(**{field: record[field] for field in fields})
 
-            jsondata = json.load(f)
-            if 'color' in jsondata[0]:
-                for line in jsondata:
-                    if not Tag.objects.filter(
-                       slug=line['slug']).exists():
-                        Tag.objects.create(
-                            name=line['name'],
-                            color=line['color'],
-                            slug=line['slug'],
-                        )
-            elif 'measurement_unit' in jsondata[0]:
-                for line in jsondata:
-                    if not Ingredient.objects.filter(
-                       name=line['name'],
-                       measurement_unit=line['measurement_unit']).exists():
-                        Ingredient.objects.create(
-                            name=line['name'],
-                            measurement_unit=line['measurement_unit']
-                        )
+    def load(self, config, records, options):
+        model, fields, key = config
+        batch_size = options['batch_size']
+        objects = self.unique_objects(model, fields, key, records)
+        started = monotonic()
+        total = 0
+        count_before = model.objects.count()
+        with transaction.atomic():
+            while True:
+                batch = list(islice(objects, batch_size))
+                if not batch:
+                    break
+                if not options['dry_run']:
+                    model.objects.bulk_create(batch, ignore_conflicts=True)
+                total += len(batch)
+                elapsed = monotonic() - started
+                self.stdout.write(
+                    f'{model._meta.verbose_name_plural}: обработано {total} '
+                    f'({total / elapsed if elapsed else total:.0f} в сек.)'
+                )
+        if options['dry_run']:
+            self.stdout.write(f'Пробный запуск: найдено {total} записей')
+            return
+        references_loaded.send(sender=model)
+        created = model.objects.count() - count_before
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено {created} новых из {total} записей '
+            f'за {monotonic() - started:.2f} сек.'
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import recount
+from recipes.events import recounted
+from recipes.models import Favorite, Recipe
+from recipes.shopping_list import rebuild_shopping_lists
+from users.models import Subscription, User
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики избранного, рецептов и подписчиков, '
+            'списки покупок и производные данные')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recount(Recipe, User, Favorite, Subscription)
+            rebuild_shopping_lists()
+            recounted.send(sender=self.__class__)
+        self.stdout.write(self.style.SUCCESS(
+            'Счётчики, списки покупок и производные данные пересчитаны'
+        ))
@@ -0,0 +1,105 @@
+from array import array
+from collections import Counter
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+
+from recipes.models import RecipeIngredient
+from recipes.pending import PendingIds
+
+
+class RecipeMatcher:
+
+    def __init__(self):
+        self.lock = Lock()
+        self.postings = {}
+        self.recipes = {}
+        self.built_at = None
+
+    def invalidate(self):
+        self.built_at = None
+
+    def is_stale(self):
+        # Как и индекс ингредиентов, изменения из других воркеров
+        # подхватываются по TTL.
+        return (
+            self.built_at is None
+            or monotonic() - self.built_at > settings.RECIPE_MATCH_INDEX_TTL
+        )
+
+    def build(self):
+        with self.lock:
+            if not self.is_stale():
+                return
+            postings = {}
+            recipes = {}
+            for ingredient_id, recipe_id in RecipeIngredient.objects.filter(
+                recipe__isnull=False
+            ).values_list('ingredient_id', 'recipe_id').order_by(
+                'ingredient_id', 'recipe_id'
+            ).iterator():
+                postings.setdefault(ingredient_id, array('q')).append(
+                    recipe_id
+                )
+                recipes.setdefault(recipe_id, set()).add(ingredient_id)
+            self.postings = postings
+            self.recipes = {
+                recipe_id: frozenset(ingredients)
+                for recipe_id, ingredients in recipes.items()
+            }
+            self.built_at = monotonic()
+
+    def update_recipes(self, recipe_ids):
+        if self.is_stale():
+            return
+        current = {recipe_id: set() for recipe_id in recipe_ids}
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id__in=current
+        ).values_list('recipe_id', 'ingredient_id'):
+            current[recipe_id].add(ingredient_id)
+        with self.lock:
+            # match() читает индекс без блокировки, поэтому изменения
+            # вносятся в копии, которые затем подменяют текущие словари.
+            postings, recipes = dict(self.postings), dict(self.recipes)
+            for recipe_id, ingredients in current.items():
+                old = recipes.pop(recipe_id, frozenset())
+                for ingredient_id in old - ingredients:
+                    postings[ingredient_id] = array('q', (
+                        posting for posting in postings[ingredient_id]
+                        if posting != recipe_id
+                    ))
+                for ingredient_id in ingredients - old:
+                    postings[ingredient_id] = array('q', sorted((
+                        *postings.get(ingredient_id, ()), recipe_id
+                    )))
+                if ingredients:
+                    recipes[recipe_id] = frozenset(ingredients)
+            self.postings, self.recipes = postings, recipes
+
+    def match(self, ingredient_ids):
+        if self.is_stale():
+            self.build()
+        with self.lock:
+            postings, recipes = self.postings, self.recipes
+        hits = Counter()
+        for ingredient_id in set(ingredient_ids):
+            hits.update(postings.get(ingredient_id, ()))
+        return sorted(
+            (
+                (recipe_id, count / len(recipes[recipe_id]))
+                for recipe_id, count in hits.items()
+                if recipe_id in recipes
+            ),
+            key=lambda match: (-match[1], -match[0]),
+        )
+
+
+recipe_matcher = RecipeMatcher()
+
+
+pending_matcher_updates = PendingIds(recipe_matcher.update_recipes)
+
+
+def schedule_matcher_update(recipe_ids):
+    pending_matcher_updates.add(recipe_ids)
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def delete_orphan_rows(apps, schema_editor):
+    for model_name in ('RecipeIngredient', 'RecipeTag'):
+        apps.get_model('recipes', model_name).objects.filter(
+            recipe__isnull=True
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_ingredient_name_trgm'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_orphan_rows, migrations.RunPython.noop),
+    ]
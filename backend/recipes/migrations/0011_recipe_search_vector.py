@@ -0,0 +1,63 @@
+# Generated by Django 3.2.16 on 2026-10-18 20:15
+
+from django.conf import settings
+from django.db import migrations
+import recipes.fields
+
+INDEX_NAME = 'recipes_recipe_search_vector_gin'
+POSTGRES_VECTOR = '''
+    setweight(to_tsvector(%(config)s, recipe.name), 'A')
+    || setweight(to_tsvector(%(config)s, coalesce((
+        SELECT string_agg(ingredient.name, ' ')
+        FROM recipes_recipeingredient AS recipe_ingredient
+        JOIN recipes_ingredient AS ingredient
+            ON ingredient.id = recipe_ingredient.ingredient_id
+        WHERE recipe_ingredient.recipe_id = recipe.id
+    ), '')), 'B')
+    || setweight(to_tsvector(%(config)s, recipe.text), 'C')
+'''
+
+
+def fill_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} '
+            'ON recipes_recipe USING gin (search_vector)'
+        )
+        schema_editor.execute(
+            f'UPDATE recipes_recipe AS recipe '
+            f'SET search_vector = {POSTGRES_VECTOR}',
+            {'config': settings.SEARCH_CONFIG},
+        )
+        return
+    Recipe = apps.get_model('recipes', 'Recipe')
+    for recipe in Recipe.objects.all():
+        recipe.search_vector = '\n'.join((
+            recipe.name,
+            ' '.join(recipe.recipe_ingredients.values_list(
+                'ingredient__name', flat=True
+            )),
+            recipe.text,
+        )).lower()
+        recipe.save(update_fields=('search_vector', ))
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=recipes.fields.SearchVectorField(editable=False, null=True, verbose_name='Поисковый индекс'),
+        ),
+        migrations.RunPython(fill_search_vectors, drop_search_index),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 3.2.16 on 2026-10-18 20:38
+
+import json
+
+from django.db import migrations, models
+from django.db.models import Prefetch
+import django.db.models.deletion
+
+BATCH_SIZE = 500
+
+
+def build_document(recipe):
+    # Та же форма, что у api.documents.build_document: сериализаторы
+    # API в миграции недоступны, поэтому поля перечислены явно.
+    author = recipe.author
+    return json.dumps({
+        'tags': [
+            {
+                'id': tag.id, 'name': tag.name,
+                'color': tag.color, 'slug': tag.slug,
+            }
+            for tag in recipe.tags.all()
+        ],
+        'author': {
+            'email': author.email, 'id': author.id,
+            'username': author.username, 'first_name': author.first_name,
+            'last_name': author.last_name, 'is_subscribed': False,
+        },
+        'ingredients': [
+            {
+                'id': item.ingredient.id, 'name': item.ingredient.name,
+                'amount': item.amount,
+                'measurement_unit': item.ingredient.measurement_unit,
+            }
+            for item in recipe.recipe_ingredients.all()
+        ],
+    }, ensure_ascii=False)
+
+
+def fill_documents(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeDocument = apps.get_model('recipes', 'RecipeDocument')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    Tag = apps.get_model('recipes', 'Tag')
+    recipes = Recipe.objects.select_related('author').prefetch_related(
+        Prefetch('tags', queryset=Tag.objects.order_by('name')),
+        Prefetch(
+            'recipe_ingredients',
+            queryset=RecipeIngredient.objects.select_related(
+                'ingredient'
+            ).order_by('id'),
+        ),
+    )
+    recipe_ids = list(
+        Recipe.objects.order_by('id').values_list('id', flat=True)
+    )
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        RecipeDocument.objects.bulk_create(
+            [
+                RecipeDocument(recipe=recipe, data=build_document(recipe))
+                for recipe in recipes.filter(
+                    pk__in=recipe_ids[start:start + BATCH_SIZE]
+                )
+            ],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeDocument',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('data', models.TextField(verbose_name='Документ')),
+            ],
+            options={
+                'verbose_name': 'Документ рецепта',
+                'verbose_name_plural': 'Документы рецептов',
+            },
+        ),
+        migrations.RunPython(fill_documents, migrations.RunPython.noop),
+    ]
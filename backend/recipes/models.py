@@ -2,6 +2,10 @@ from colorfield.fields import ColorField
 from django.contrib.auth import get_user_model
 from django.core import validators
 from django.db import models
+from django.db.models import Prefetch
+
+from recipes.counters import CounterFieldsMixin
+from recipes.fields import SearchVectorField
 
 User = get_user_model()
 MAX_LENGTH = 200
@@ -57,7 +61,34 @@ class Tag(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+
+    def latest_by_author(self, author_ids, limit=None):
+        if not author_ids:
+            return self.none()
+        if limit is None:
+            return self.filter(author_id__in=author_ids)
+        placeholders = ', '.join(['%s'] * len(author_ids))
+        return self.raw(
+            'SELECT * FROM (SELECT *, ROW_NUMBER() OVER ('
+            'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+            f') AS row_number FROM {self.model._meta.db_table} '
+            f'WHERE author_id IN ({placeholders})) AS ranked '
+            'WHERE row_number <= %s ORDER BY author_id, row_number',
+            (*author_ids, limit),
+        )
+
+    def with_related(self):
+        return self.prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient'),
+            ),
+        )
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -74,6 +105,18 @@ class Recipe(models.Model):
         blank=False,
         null=True,
     )
+    image_card = models.ImageField(
+        'Картинка для карточки',
+        upload_to='media/recipes/variants/',
+        blank=True,
+        editable=False,
+    )
+    image_detail = models.ImageField(
+        'Картинка для страницы рецепта',
+        upload_to='media/recipes/variants/',
+        blank=True,
+        editable=False,
+    )
     text = models.TextField(
         'Описание рецепта',
         help_text='Введите описание рецепта'
@@ -99,11 +142,31 @@ class Recipe(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        'Поисковый индекс',
+        null=True,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    counter_fields = ('favorites_count', )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ('-pub_date', )
+        ordering = ('-pub_date', '-id')
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx',
+            ),
+        )
 
     def __str__(self):
         return f'{self.name}, {self.author.username}'
@@ -161,6 +224,12 @@ class RecipeTag(models.Model):
                 name='recipe_tag_unique'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('tag', 'recipe'),
+                name='recipetag_tag_recipe_idx',
+            ),
+        )
 
 
 class BaseShoppingFavorite(models.Model):
@@ -206,3 +275,63 @@ class Favorite(BaseShoppingFavorite):
                 name='favorite_unique',
             ),
         )
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент',
+    )
+    name = models.CharField(
+        'Название',
+        max_length=MAX_LENGTH,
+    )
+    measurement_unit = models.CharField(
+        'Единица измерения',
+        max_length=MAX_LENGTH,
+    )
+    amount = models.PositiveIntegerField(
+        'Количество',
+    )
+
+    class Meta:
+        ordering = ('name', )
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Список покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='shopping_list_item_unique',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.name} - {self.amount} {self.measurement_unit}'
+
+
+class RecipeDocument(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='document',
+        verbose_name='Рецепт',
+    )
+    data = models.TextField(
+        'Документ',
+    )
+
+    class Meta:
+        verbose_name = 'Документ рецепта'
+        verbose_name_plural = 'Документы рецептов'
+
+    def __str__(self):
+        return f'Документ рецепта {self.recipe_id}'
@@ -0,0 +1,21 @@
+from threading import local
+
+from django.db import transaction
+
+
+class PendingIds(local):
+    # Сигналы приходят на каждую строку, а обработчик вызывается после
+    # коммита один раз на все id, накопленные за транзакцию.
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.ids = set()
+
+    def add(self, ids):
+        self.ids.update(ids)
+        transaction.on_commit(self.flush)
+
+    def flush(self):
+        ids, self.ids = self.ids, set()
+        if ids:
+            self.handler(ids)
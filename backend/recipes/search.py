@@ -0,0 +1,68 @@
+from bisect import bisect_left
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+
+from recipes.models import Ingredient
+
+
+class IngredientIndex:
+
+    def __init__(self):
+        self.lock = Lock()
+        # Ключи и ингредиенты заменяются одним присваиванием: читатели
+        # берут индекс без блокировки и не должны видеть их вперемешку.
+        self.index = ([], [])
+        self.built_at = None
+
+    def invalidate(self):
+        self.built_at = None
+
+    def is_stale(self):
+        # Сигналы приходят только в процесс, изменивший ингредиент,
+        # поэтому индекс других воркеров обновляется по TTL.
+        return (
+            self.built_at is None
+            or monotonic() - self.built_at > settings.INGREDIENT_INDEX_TTL
+        )
+
+    def build(self):
+        with self.lock:
+            if not self.is_stale():
+                return
+            ingredients = sorted(
+                Ingredient.objects.all(),
+                key=lambda ingredient: (ingredient.name.lower(), ingredient.pk)
+            )
+            self.index = (
+                [ingredient.name.lower() for ingredient in ingredients],
+                ingredients,
+            )
+            self.built_at = monotonic()
+
+    def prefix_search(self, prefix, limit):
+        if self.is_stale():
+            self.build()
+        keys, ingredients = self.index
+        start = bisect_left(keys, prefix)
+        end = start
+        while (end < len(keys) and end - start < limit
+               and keys[end].startswith(prefix)):
+            end += 1
+        return ingredients[start:end]
+
+    def search(self, name, limit=None):
+        limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+        name = name.strip().lower()
+        found = self.prefix_search(name, limit)
+        if name and len(found) < limit:
+            found += Ingredient.objects.filter(
+                name__icontains=name
+            ).exclude(
+                name__istartswith=name
+            )[:limit - len(found)]
+        return found
+
+
+ingredient_index = IngredientIndex()
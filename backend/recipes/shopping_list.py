@@ -0,0 +1,104 @@
+from threading import local
+
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from recipes.models import RecipeIngredient, ShoppingCart, ShoppingListItem
+from users.models import User
+
+
+class PendingRefresh(local):
+
+    def __init__(self):
+        self.users = set()
+        self.ingredients = set()
+        # Рецепты, чьи покупатели или ингредиенты входят в пересчёт:
+        # они читаются после коммита одним запросом на всю транзакцию.
+        self.cart_recipes = set()
+        self.ingredient_recipes = set()
+
+
+pending = PendingRefresh()
+
+
+def cart_users(recipe_ids):
+    return set(ShoppingCart.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('user_id', flat=True))
+
+
+def recipe_ingredients(recipe_ids):
+    return set(RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('ingredient_id', flat=True))
+
+
+def refresh_pending_shopping_lists():
+    users, pending.users = pending.users, set()
+    ingredients, pending.ingredients = pending.ingredients, set()
+    cart_recipes, pending.cart_recipes = pending.cart_recipes, set()
+    ingredient_recipes, pending.ingredient_recipes = (
+        pending.ingredient_recipes, set()
+    )
+    if cart_recipes:
+        users |= cart_users(cart_recipes)
+    if ingredient_recipes:
+        ingredients |= recipe_ingredients(ingredient_recipes)
+    if users and ingredients:
+        refresh_shopping_lists(users, ingredients)
+
+
+def schedule_shopping_list_refresh(
+    users=(), ingredients=(), cart_recipes=(), ingredient_recipes=()
+):
+    # Как и документы рецептов, области копятся до коммита: каскадное
+    # удаление пересчитывается один раз, а откат ничего не оставляет,
+    # кроме лишнего, но безопасного пересчёта при следующем коммите.
+    pending.users.update(users)
+    pending.ingredients.update(ingredients)
+    pending.cart_recipes.update(cart_recipes)
+    pending.ingredient_recipes.update(ingredient_recipes)
+    transaction.on_commit(refresh_pending_shopping_lists)
+
+
+def refresh_shopping_lists(user_ids, ingredient_ids):
+    # Пересчитываются только затронутые пары (пользователь, ингредиент),
+    # поэтому повторный вызов для той же области безопасен.
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    # Сигналы корзины приходят и вне транзакции (autocommit), а
+    # select_for_update требует её: блокировка держится до вставки.
+    with transaction.atomic():
+        if connection.features.has_select_for_update:
+            list(User.objects.select_for_update().filter(
+                pk__in=user_ids
+            ).order_by('pk').values_list('pk', flat=True))
+        totals = RecipeIngredient.objects.filter(
+            recipe__shopping_cart__user_id__in=user_ids,
+            ingredient_id__in=ingredient_ids,
+        ).values_list(
+            'recipe__shopping_cart__user_id', 'ingredient_id',
+            'ingredient__name', 'ingredient__measurement_unit',
+        ).annotate(total=Sum('amount')).order_by()
+        items = [
+            ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id, name=name,
+                measurement_unit=measurement_unit, amount=total,
+            )
+            for user_id, ingredient_id, name, measurement_unit, total in totals
+        ]
+        ShoppingListItem.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=ingredient_ids
+        ).delete()
+        ShoppingListItem.objects.bulk_create(items)
+
+
+def rebuild_shopping_lists():
+    ShoppingListItem.objects.all().delete()
+    refresh_shopping_lists(
+        ShoppingCart.objects.values_list('user_id', flat=True).distinct(),
+        RecipeIngredient.objects.filter(
+            recipe__shopping_cart__isnull=False
+        ).values('ingredient_id'),
+    )
@@ -0,0 +1,126 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from recipes.counters import change_counter
+from recipes.fulltext import schedule_search_vector_update
+from recipes.matching import schedule_matcher_update
+from recipes.images import needs_variants, schedule_recipe_image
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShoppingListItem)
+from recipes.search import ingredient_index
+from recipes.shopping_list import (cart_users, recipe_ingredients,
+                                   schedule_shopping_list_refresh)
+from users.models import Subscription, User
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_recipes_search(instance, created, **kwargs):
+    if not created:
+        schedule_search_vector_update(
+            instance.recipeingredient_set.values_list('recipe_id', flat=True)
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search(instance, update_fields, **kwargs):
+    if update_fields is None or {'name', 'text'} & set(update_fields):
+        schedule_search_vector_update((instance.pk, ))
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def update_recipe_ingredients_search(instance, **kwargs):
+    if instance.recipe_id is not None:
+        schedule_search_vector_update((instance.recipe_id, ))
+        schedule_matcher_update((instance.recipe_id, ))
+
+
+@receiver(post_save, sender=Recipe)
+def add_recipe_to_matcher(instance, created, **kwargs):
+    if created:
+        schedule_matcher_update((instance.pk, ))
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_matcher(instance, **kwargs):
+    schedule_matcher_update((instance.pk, ))
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def decrement_favorites_count(instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_save, sender=Recipe)
+def process_image(instance, update_fields, **kwargs):
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if needs_variants(instance):
+        schedule_recipe_image(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Subscription)
+def increment_subscribers_count(instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'subscribers_count', 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def decrement_subscribers_count(instance, **kwargs):
+    change_counter(User, instance.author_id, 'subscribers_count', -1)
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def update_cart_shopping_list(instance, **kwargs):
+    schedule_shopping_list_refresh(
+        users=(instance.user_id, ), ingredient_recipes=(instance.recipe_id, )
+    )
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def update_recipe_shopping_lists(instance, **kwargs):
+    if instance.recipe_id is not None:
+        schedule_shopping_list_refresh(
+            ingredients=(instance.ingredient_id, ),
+            cart_recipes=(instance.recipe_id, ),
+        )
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_recipe_shopping_lists(instance, **kwargs):
+    # После коммита корзин и ингредиентов удалённого рецепта уже нет.
+    schedule_shopping_list_refresh(
+        users=cart_users((instance.pk, )),
+        ingredients=recipe_ingredients((instance.pk, )),
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+def rename_shopping_list_items(instance, created, **kwargs):
+    if not created:
+        ShoppingListItem.objects.filter(ingredient=instance).exclude(
+            name=instance.name, measurement_unit=instance.measurement_unit
+        ).update(
+            name=instance.name, measurement_unit=instance.measurement_unit
+        )
@@ -9,18 +9,12 @@ EMPTY_MESSAGE = '-пусто-'
 @admin.register(User)
 class UserAdmin(UserAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name',
-                    'count_subscribers', 'count_recipes')
+                    'subscribers_count', 'recipes_count')
     search_fields = ('username', 'email')
     list_filter = ('username', 'email')
     ordering = ('username', )
     empty_value_display = EMPTY_MESSAGE
 
-    def count_subscribers(self, obj):
-        return obj.subscriber.count()
-
-    def count_recipes(self, obj):
-        return obj.recipes.count()
-
 
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
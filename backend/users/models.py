@@ -1,13 +1,14 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from recipes.counters import CounterFieldsMixin
 from users.validators import username_validator
 
 MAX_LENGTH_NAME = 150
 MAX_LENGTH_EMAIL = 254
 
 
-class User(AbstractUser):
+class User(CounterFieldsMixin, AbstractUser):
     username = models.CharField(
         max_length=MAX_LENGTH_NAME,
         verbose_name='Имя пользователя',
@@ -29,6 +30,18 @@ class User(AbstractUser):
         verbose_name='Фамилия',
         blank=False,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False,
+    )
+    subscribers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+        editable=False,
+    )
+
+    counter_fields = ('recipes_count', 'subscribers_count')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')